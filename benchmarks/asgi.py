@@ -0,0 +1,73 @@
+"""Minimal in-process HTTP client for driving the ASGI `app` without a server."""
+import asyncio
+import time
+
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlencode
+
+
+async def request(
+    app,
+    method: str,
+    path: str,
+    headers: Optional[Dict[str, str]] = None,
+    body: bytes = b"",
+    form: Optional[Dict[str, str]] = None
+) -> Tuple[int, Dict[str, str], bytes]:
+    headers = dict(headers or {})
+    if form is not None:
+        body = urlencode(form).encode()
+        headers["content-type"] = "application/x-www-form-urlencoded"
+    path, _, query = path.partition("?")
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": query.encode(),
+        "root_path": "",
+        "headers": [(k.lower().encode(), v.encode()) for k, v in headers.items()]
+            + [(b"host", b"bench"), (b"content-length", str(len(body)).encode())],
+        "client": ("127.0.0.1", 0),
+        "server": ("bench", 80),
+    }
+    sent = False
+    disconnected = asyncio.Event()
+    response = {"status": 0, "headers": {}, "body": []}
+
+    async def receive():
+        nonlocal sent
+        if not sent:
+            sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        await disconnected.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            response["status"] = message["status"]
+            response["headers"] = {k.decode(): v.decode() for k, v in message.get("headers", [])}
+        elif message["type"] == "http.response.body":
+            response["body"].append(message.get("body", b""))
+            if not message.get("more_body"):
+                disconnected.set()
+
+    await app(scope, receive, send)
+    return response["status"], response["headers"], b"".join(response["body"])
+
+
+async def timed_request(app, method: str, path: str, **kwargs) -> Tuple[int, float]:
+    """Return the status and latency in milliseconds of one request."""
+    start = time.perf_counter()
+    status, _, _ = await request(app, method, path, **kwargs)
+    return status, (time.perf_counter() - start) * 1000
+
+
+def percentile(values, q: float):
+    values = sorted(values)
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(round(q / 100 * (len(values) - 1))))]
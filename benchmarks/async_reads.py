@@ -0,0 +1,62 @@
+"""Compare the sync (threadpool) and asyncio database paths under many concurrent readers.
+
+    python -m benchmarks.async_reads [clients] [requests_per_client] [houses]
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}")
+
+from benchmarks.asgi import percentile, timed_request  # noqa: E402
+from src import crud, migrations, schemas  # noqa: E402
+from src.database import (  # noqa: E402
+    AsyncSessionLocal, SessionLocal, create_async_db_engine, db_url, engine, get_async_db, get_read_db
+)
+from src.metrics import PoolStats  # noqa: E402
+from src.main import app  # noqa: E402
+
+
+def seed(houses: int):
+    migrations.upgrade(engine)
+    rows = [
+        schemas.HouseImport(name=f"House {i}", members=[schemas.CharacterBase(name=f"Member {j}") for j in range(5)])
+        for i in range(houses)
+    ]
+    with SessionLocal() as db:
+        crud.import_houses(db, rows)
+
+
+async def client(requests: int, houses: int, latencies: list, statuses: list):
+    for i in range(requests):
+        path = "/houses/?limit=20" if i % 2 else f"/houses/House {i % houses}"
+        status, latency = await timed_request(app, "GET", path)
+        statuses.append(status)
+        latencies.append(latency)
+
+
+async def run(clients: int, requests: int, houses: int):
+    latencies, statuses = [], []
+    start = time.perf_counter()
+    await asyncio.gather(*(client(requests, houses, latencies, statuses) for _ in range(clients)))
+    return latencies, statuses, time.perf_counter() - start
+
+
+def main(clients: int = 500, requests: int = 10, houses: int = 1000):
+    seed(houses)
+    AsyncSessionLocal.configure(bind=create_async_db_engine(db_url, PoolStats()))
+    print(f"{'mode':>6} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    for mode, dependency in (("sync", None), ("async", get_async_db)):
+        app.dependency_overrides = {get_read_db: dependency} if dependency else {}
+        latencies, statuses, elapsed = asyncio.run(run(clients, requests, houses))
+        errors = sum(status != 200 for status in statuses)
+        print(
+            f"{mode:>6} {len(latencies) / elapsed:>8.0f} {percentile(latencies, 50):>8.1f}"
+            f" {percentile(latencies, 95):>8.1f} {percentile(latencies, 99):>8.1f} {errors:>7}"
+        )
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
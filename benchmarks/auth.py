@@ -0,0 +1,62 @@
+"""Authorization overhead per request, with and without the verified-token cache.
+
+Times token verification and the scope check alone, then whole GET /users/
+requests carrying the same bearer token.
+
+    python -m benchmarks.auth [iterations]
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}")
+
+from benchmarks.asgi import request  # noqa: E402
+from src import cache, crud, migrations, schemas  # noqa: E402
+from src import main as api  # noqa: E402
+from src.database import SessionLocal, engine  # noqa: E402
+
+SCOPES = ["users:read"]
+
+
+def seed():
+    migrations.upgrade(engine)
+    with SessionLocal() as db:
+        if crud.read_user_by_email(db, "auth@mail.com") is None:
+            crud.create_user(db, schemas.UserCreate(email="auth@mail.com", password="secret"))
+        crud.read_user_by_email(db, "auth@mail.com").scopes = "users:read houses:read"
+        db.commit()
+    return api.create_access_token(data={"sub": "auth@mail.com", "scopes": "users:read houses:read"})
+
+
+def verify(token: str, iterations: int):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        claims = api.decode_token(token)
+        assert claims.scopes.issuperset(SCOPES)
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+async def requests(token: str, iterations: int):
+    headers = {"authorization": f"Bearer {token}"}
+    start = time.perf_counter()
+    for _ in range(iterations):
+        status, _, _ = await request(api.app, "GET", "/users/?limit=1", headers=headers)
+        assert status == 200
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def main(iterations: int = 2000):
+    token = seed()
+    print(f"{'tokens':>9} {'verify us':>10} {'request us':>11}")
+    for mode, tokens in (("uncached", cache.TTLCache(maxsize=0)), ("cached", cache.TTLCache(ttl=float("inf")))):
+        cache.tokens = tokens
+        verify_us = verify(token, iterations)
+        request_us = asyncio.run(requests(token, iterations // 4))
+        print(f"{mode:>9} {verify_us:>10.1f} {request_us:>11.1f}")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,41 @@
+"""Measure crud.import_houses throughput in rows (houses + members) per second.
+
+    python -m benchmarks.bulk_import [houses] [members_per_house]
+"""
+import os
+import sys
+import tempfile
+import time
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from src import crud, migrations, schemas
+
+
+def main(houses: int = 10_000, members_per_house: int = 5):
+    path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    engine = create_engine(f"sqlite:///{path}")
+    migrations.upgrade(engine)
+    Session = sessionmaker(bind=engine)
+
+    rows = [
+        schemas.HouseImport(
+            name=f"House {i}",
+            words="Words",
+            members=[schemas.CharacterBase(name=f"Member {j}") for j in range(members_per_house)]
+        )
+        for i in range(houses)
+    ]
+    with Session() as db:
+        start = time.perf_counter()
+        result = crud.import_houses(db, rows)
+        elapsed = time.perf_counter() - start
+
+    total = result.houses + result.members
+    print(f"{total} rows in {elapsed:.2f}s: {total / elapsed:,.0f} rows/s")
+    os.remove(path)
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,94 @@
+"""Bytes saved vs CPU spent compressing realistic house pages, per encoding and level.
+
+Renders GET /houses/ pages with embedded members once, then times each
+compressor on them, and finally times whole requests through the app with
+each Accept-Encoding.
+
+    python -m benchmarks.compression [houses] [members_per_house] [repeats]
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}")
+
+from benchmarks.asgi import request  # noqa: E402
+from src import cache, compression, crud, migrations, schemas  # noqa: E402
+from src.database import SessionLocal, engine  # noqa: E402
+from src.main import app  # noqa: E402
+
+CODECS = [("gzip", level) for level in (1, 6, 9)] + [("br", quality) for quality in (1, 4, 6, 11)]
+
+
+def seed(houses: int, members: int):
+    migrations.upgrade(engine)
+    rows = [
+        schemas.HouseImport(
+            name=f"House {i}",
+            words="Winter is coming",
+            description=f"A great house of the Seven Kingdoms, seated at castle number {i}.",
+            members=[
+                schemas.CharacterBase(
+                    name=f"Member {i}.{j}",
+                    titles="Lord of the castle, Warden of the North",
+                    description="Sworn to the house since the days of the first men."
+                )
+                for j in range(members)
+            ]
+        )
+        for i in range(houses)
+    ]
+    with SessionLocal() as db:
+        crud.import_houses(db, rows)
+
+
+def compressor(encoding: str, level: int):
+    if encoding == "br":
+        return compression.BrotliCompressor(level)
+    return compression.GzipCompressor(level)
+
+
+def compress_time(body: bytes, encoding: str, level: int, repeats: int):
+    """Compressed size and CPU milliseconds per compression."""
+    start = time.process_time()
+    for _ in range(repeats):
+        codec = compressor(encoding, level)
+        compressed = codec.compress(body) + codec.finish()
+    return len(compressed), (time.process_time() - start) / repeats * 1000
+
+
+async def request_time(path: str, accept_encoding: str, repeats: int):
+    """Response size and CPU milliseconds per request, house cache included."""
+    cache.houses.entries.clear()
+    start = time.process_time()
+    for _ in range(repeats):
+        status, _, body = await request(app, "GET", path, headers={"accept-encoding": accept_encoding})
+        assert status == 200
+    return len(body), (time.process_time() - start) / repeats * 1000
+
+
+def main(houses: int = 1000, members: int = 5, repeats: int = 20):
+    seed(houses, members)
+    print(f"{'limit':>6} {'codec':>8} {'bytes':>10} {'ratio':>6} {'cpu ms':>8} {'MB/s':>7}")
+    for limit in (20, 100, 1000):
+        path = f"/houses/?limit={limit}"
+        _, _, body = asyncio.run(request(app, "GET", path, headers={"accept-encoding": "identity"}))
+        print(f"{limit:>6} {'identity':>8} {len(body):>10} {1:>6.1f} {0:>8.2f} {'':>7}")
+        for encoding, level in CODECS:
+            size, ms = compress_time(body, encoding, level, repeats)
+            print(
+                f"{limit:>6} {f'{encoding}-{level}':>8} {size:>10} {len(body) / size:>6.1f}"
+                f" {ms:>8.2f} {len(body) / ms / 1000:>7.0f}"
+            )
+
+    print(f"\n{'request':>26} {'accept':>9} {'bytes':>10} {'cpu ms':>8}")
+    for path in ("/houses/?limit=100", "/houses/?limit=1000", "/houses/export"):
+        for accept_encoding in ("identity", "gzip", "br"):
+            size, ms = asyncio.run(request_time(path, accept_encoding, repeats))
+            print(f"{path:>26} {accept_encoding:>9} {size:>10} {ms:>8.2f}")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
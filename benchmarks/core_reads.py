@@ -0,0 +1,65 @@
+"""Time and peak memory of reading large pages as ORM objects vs Core records.
+
+    python -m benchmarks.core_reads [houses] [members_per_house] [repeats]
+"""
+import gc
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}")
+
+from src import crud, migrations, schemas  # noqa: E402
+from src.database import SessionLocal, engine  # noqa: E402
+
+
+def seed(houses: int, members: int):
+    migrations.upgrade(engine)
+    rows = [
+        schemas.HouseImport(
+            name=f"House {i}",
+            words="Winter is coming",
+            members=[schemas.CharacterBase(name=f"Member {i}.{j}", titles="Lord") for j in range(members)]
+        )
+        for i in range(houses)
+    ]
+    with SessionLocal() as db:
+        crud.import_houses(db, rows)
+
+
+def measure(read, limit: int, repeats: int):
+    """Mean milliseconds per page, and peak KiB allocated while reading one page."""
+    elapsed = 0.0
+    for _ in range(repeats):
+        with SessionLocal() as db:
+            start = time.perf_counter()
+            read(db, limit=limit)
+            elapsed += time.perf_counter() - start
+    gc.collect()
+    with SessionLocal() as db:
+        tracemalloc.start()
+        read(db, limit=limit)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return elapsed / repeats * 1000, peak / 1024
+
+
+def main(houses: int = 5000, members: int = 5, repeats: int = 5):
+    seed(houses, members)
+    readers = {
+        "orm selectin": lambda db, limit: crud.read_houses(db, limit=limit, members="selectin"),
+        "core selectin": lambda db, limit: crud.read_house_records(db, limit=limit, members="selectin"),
+        "orm joined": lambda db, limit: crud.read_houses(db, limit=limit, members="joined"),
+        "core joined": lambda db, limit: crud.read_house_records(db, limit=limit, members="joined"),
+    }
+    print(f"{'limit':>6} {'reader':>14} {'ms/page':>9} {'pages/s':>8} {'peak KiB':>9}")
+    for limit in (100, 1000, houses):
+        for name, read in readers.items():
+            ms, peak = measure(read, limit, repeats)
+            print(f"{limit:>6} {name:>14} {ms:>9.1f} {1000 / ms:>8.1f} {peak:>9.0f}")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
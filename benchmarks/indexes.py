@@ -0,0 +1,117 @@
+"""Write and read cost of the schema's indexes before and after the index audit (migration 5).
+
+Builds two SQLite databases with `characters` members spread over `houses`
+houses: one with the indexes the models used to declare on every column, one
+as migrated. Times bulk loading the characters, committed member inserts and
+the reads the app issues, and reports the database size.
+
+    python -m benchmarks.indexes [characters] [houses] [repeats]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}")
+
+from sqlalchemy import create_engine, insert, select, text  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+from src import crud, migrations, models, schemas  # noqa: E402
+
+# What the models declared before the audit, besides ix_users_email and ix_characters_house_id
+LEGACY_INDEXES = [
+    "DROP INDEX ix_houses_name_lower",
+    "DROP INDEX ix_characters_house_id_name",
+    "CREATE INDEX ix_users_id ON users (id)",
+    "CREATE INDEX ix_houses_id ON houses (id)",
+    "CREATE UNIQUE INDEX ix_houses_name ON houses (name)",
+    "CREATE INDEX ix_houses_words ON houses (words)",
+    "CREATE INDEX ix_houses_description ON houses (description)",
+    "CREATE INDEX ix_characters_id ON characters (id)",
+    "CREATE INDEX ix_characters_name ON characters (name)",
+    "CREATE INDEX ix_characters_titles ON characters (titles)",
+    "CREATE INDEX ix_characters_description ON characters (description)",
+]
+
+
+def build(path: str, legacy: bool, characters: int, houses: int):
+    """Create and load a database, returning its sessionmaker and the seconds the character load took."""
+    engine = create_engine(f"sqlite:///{path}")
+    migrations.upgrade(engine)
+    with engine.begin() as connection:
+        for statement in LEGACY_INDEXES if legacy else []:
+            connection.execute(text(statement))
+        connection.execute(insert(models.House), [
+            {"name": f"House {i}", "words": f"Words of house {i}", "description": f"House number {i}"}
+            for i in range(houses)
+        ])
+    rng = random.Random(0)
+    start = time.perf_counter()
+    with engine.begin() as connection:
+        for offset in range(0, characters, 10000):
+            connection.execute(insert(models.Character), [
+                {
+                    "name": f"Member {i}",
+                    "titles": rng.choice(["Lord", "Lady", "Ser", "Maester", None]),
+                    "description": f"Sworn to house {i % houses}, number {i}",
+                    "house_id": i % houses + 1
+                }
+                for i in range(offset, min(offset + 10000, characters))
+            ])
+    return sessionmaker(bind=engine), time.perf_counter() - start
+
+
+def per_call(fn, repeats: int):
+    start = time.perf_counter()
+    for i in range(repeats):
+        fn(i)
+    return (time.perf_counter() - start) / repeats * 1000
+
+
+def measure(Session, houses: int, repeats: int):
+    """Milliseconds per operation."""
+    with Session() as db:
+        by_name = per_call(lambda i: crud.read_house_record_by_name(db, f"House {i % houses}", members=None), repeats)
+        by_name_case = per_call(
+            lambda i: crud.read_house_record_by_name(db, f"HOUSE {i % houses}", members=None), repeats
+        )
+        members_page = per_call(lambda i: crud.read_house_members(db, i % houses + 1, limit=100), repeats)
+        member_by_name = per_call(lambda i: db.execute(
+            select(models.Character.id).filter(
+                models.Character.house_id == i % houses + 1, models.Character.name == f"Member {i * houses}"
+            )
+        ).all(), repeats)
+        member_insert = per_call(lambda i: crud.create_house_member(
+            db, schemas.CharacterBase(name=f"Recruit {i}", titles="Ser", description="Newly sworn"), i % houses + 1
+        ), repeats)
+    return {
+        "house by name": by_name,
+        "house by name, other case": by_name_case,
+        "members page": members_page,
+        "member by house and name": member_by_name,
+        "member insert + commit": member_insert,
+    }
+
+
+def main(characters: int = 1000000, houses: int = 1000, repeats: int = 500):
+    directory = tempfile.mkdtemp()
+    results = {}
+    for label, legacy in (("before", True), ("after", False)):
+        path = os.path.join(directory, f"{label}.db")
+        Session, load = build(path, legacy, characters, houses)
+        results[label] = dict(measure(Session, houses, repeats), load=load, size=os.path.getsize(path))
+
+    before, after = results["before"], results["after"]
+    print(f"{characters} characters in {houses} houses")
+    print(f"{'':>28} {'before':>10} {'after':>10}")
+    print(f"{'bulk load, chars/s':>28} {characters / before['load']:>10.0f} {characters / after['load']:>10.0f}")
+    print(f"{'database MB':>28} {before['size'] / 2 ** 20:>10.1f} {after['size'] / 2 ** 20:>10.1f}")
+    for name in before:
+        if name not in ("load", "size"):
+            print(f"{name + ', ms':>28} {before[name]:>10.3f} {after[name]:>10.3f}")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
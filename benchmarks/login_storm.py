@@ -0,0 +1,59 @@
+"""Latency of GET /houses/ while a burst of logins hashes passwords.
+
+Runs once with bcrypt on the shared request threadpool (PASSWORD_HASH_WORKERS=0,
+the old behaviour) and once on the dedicated hashing pool.
+
+    python -m benchmarks.login_storm [logins] [workers]
+"""
+import asyncio
+import os
+import sys
+import tempfile
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}")
+
+from benchmarks.asgi import percentile, request, timed_request  # noqa: E402
+from src import crud, hashing, migrations, schemas  # noqa: E402
+from src.database import SessionLocal, engine  # noqa: E402
+from src.main import app  # noqa: E402
+
+
+def seed():
+    migrations.upgrade(engine)
+    with SessionLocal() as db:
+        if crud.read_user_by_email(db, "storm@mail.com") is None:
+            crud.create_user(db, schemas.UserCreate(email="storm@mail.com", password="secret"))
+        crud.import_houses(db, [schemas.HouseImport(name=f"House {i}") for i in range(100)])
+
+
+async def storm(logins: int):
+    form = {"username": "storm@mail.com", "password": "secret"}
+    login_tasks = [
+        asyncio.ensure_future(request(app, "POST", "/login", form=form)) for _ in range(logins)
+    ]
+    reads = []
+    while not all(task.done() for task in login_tasks):
+        _, latency = await timed_request(app, "GET", "/houses/?limit=10")
+        reads.append(latency)
+    statuses = [status for status, _, _ in await asyncio.gather(*login_tasks)]
+    return reads, statuses
+
+
+def main(logins: int = 100, workers: int = hashing.PASSWORD_HASH_WORKERS):
+    seed()
+    print(f"{'mode':>12} {'reads':>6} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8} {'logins 200/503':>15}")
+    for mode, pool in (
+        ("threadpool", hashing.HashingPool(workers=0)),
+        ("hash pool", hashing.HashingPool(workers=workers, queue_timeout=hashing.PASSWORD_HASH_QUEUE_TIMEOUT)),
+    ):
+        hashing.pool = pool
+        reads, statuses = asyncio.run(storm(logins))
+        pool.shutdown()
+        print(
+            f"{mode:>12} {len(reads):>6} {percentile(reads, 50):>8.1f} {percentile(reads, 95):>8.1f}"
+            f" {max(reads):>8.1f} {statuses.count(200):>7}/{statuses.count(503)}"
+        )
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
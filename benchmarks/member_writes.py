@@ -0,0 +1,64 @@
+"""Member inserts per second, committed per request vs coalesced by the write batcher.
+
+Each level runs that many concurrent clients POSTing /houses/{id}/members/
+through the ASGI `app` until `inserts` members have been created.
+
+    python -m benchmarks.member_writes [inserts] [window_ms]
+"""
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}")
+
+from benchmarks.asgi import request  # noqa: E402
+from src import batching, crud, migrations, schemas  # noqa: E402
+from src.database import SessionLocal, engine  # noqa: E402
+from src.main import app, get_current_user  # noqa: E402
+
+HEADERS = {"content-type": "application/json"}
+
+
+def seed(houses: int = 10):
+    migrations.upgrade(engine)
+    with SessionLocal() as db:
+        return [crud.create_house(db, schemas.HouseBase(name=f"House {i}")).id for i in range(houses)]
+
+
+async def client(house_ids, inserts: int, offset: int):
+    for i in range(inserts):
+        body = json.dumps({"name": f"Recruit {offset}.{i}"}).encode()
+        status, _, _ = await request(
+            app, "POST", f"/houses/{house_ids[(offset + i) % len(house_ids)]}/members/", headers=HEADERS, body=body
+        )
+        assert status == 201
+
+
+async def run(house_ids, clients: int, inserts: int):
+    start = time.perf_counter()
+    await asyncio.gather(*(client(house_ids, inserts // clients, offset) for offset in range(clients)))
+    return clients * (inserts // clients) / (time.perf_counter() - start)
+
+
+def main(inserts: int = 2000, window_ms: float = 2):
+    house_ids = seed()
+    user = schemas.User(email="bench@mail.com", id=1, is_active=True, scopes="houses:write")
+    app.dependency_overrides[get_current_user] = lambda: user
+    modes = {
+        "per request": None,
+        f"batched {window_ms:g} ms": batching.MemberWriteBatcher(SessionLocal, window=window_ms / 1000),
+    }
+    print(f"{'clients':>7} " + " ".join(f"{mode + ' ins/s':>20}" for mode in modes))
+    for clients in (1, 10, 50, 200):
+        rates = []
+        for batcher in modes.values():
+            batching.members = batcher
+            rates.append(asyncio.run(run(house_ids, clients, inserts)))
+        print(f"{clients:>7} " + " ".join(f"{rate:>20.0f}" for rate in rates))
+
+
+if __name__ == "__main__":
+    main(*(float(arg) if i else int(arg) for i, arg in enumerate(sys.argv[1:])))
@@ -0,0 +1,53 @@
+"""Compare OFFSET and keyset page latency at increasing depths.
+
+    python -m benchmarks.pagination [rows]
+"""
+import os
+import sys
+import tempfile
+import time
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from src import crud, migrations, models
+
+
+def seed(engine, rows: int):
+    migrations.upgrade(engine)
+    batch = 50_000
+    with engine.begin() as conn:
+        for start in range(0, rows, batch):
+            conn.execute(
+                models.House.__table__.insert(),
+                [{"name": f"House {i}", "words": "Words"} for i in range(start, min(start + batch, rows))]
+            )
+
+
+def timed(fn, repeat: int = 5):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main(rows: int = 1_000_000, limit: int = 100):
+    path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    engine = create_engine(f"sqlite:///{path}")
+    seed(engine, rows)
+    Session = sessionmaker(bind=engine)
+
+    depths = [limit * 10 ** k for k in range(len(str(rows))) if limit * 10 ** k < rows - limit]
+    print(f"{'depth':>10} {'offset ms':>10} {'cursor ms':>10}")
+    for depth in depths + [rows - limit]:
+        with Session() as db:
+            offset_ms = timed(lambda: crud.read_houses(db, skip=depth, limit=limit))
+            cursor_ms = timed(lambda: crud.read_houses(db, after_id=depth, limit=limit))
+        print(f"{depth:>10} {offset_ms:>10.2f} {cursor_ms:>10.2f}")
+    os.remove(path)
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
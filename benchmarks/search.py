@@ -0,0 +1,69 @@
+"""Compare a LIKE scan with the full-text index over characters.
+
+    python -m benchmarks.search [characters]
+"""
+import os
+import sys
+import tempfile
+import time
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from src import crud, migrations, models, schemas, search
+
+TITLES = ["Lord of Winterfell", "Hand of the King", "Master of Coin", "Kingslayer", "Khaleesi", "Maester"]
+RARE_TITLE = "Warden of the North"
+
+
+def seed(db, characters: int, per_house: int = 100):
+    houses = [
+        schemas.HouseImport(
+            name=f"House {i}",
+            members=[
+                schemas.CharacterBase(
+                    name=f"Character {i}-{j}",
+                    titles=RARE_TITLE if (i * per_house + j) % 5000 == 0 else TITLES[(i + j) % len(TITLES)]
+                )
+                for j in range(per_house)
+            ]
+        )
+        for i in range(characters // per_house)
+    ]
+    start = time.perf_counter()
+    crud.import_houses(db, houses)
+    return time.perf_counter() - start
+
+
+def timed(fn, repeat: int = 5):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main(characters: int = 1_000_000):
+    path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    engine = create_engine(f"sqlite:///{path}")
+    migrations.upgrade(engine)
+    Session = sessionmaker(bind=engine)
+
+    with Session() as db:
+        elapsed = seed(db, characters)
+        print(f"seeded and indexed {characters} characters in {elapsed:.1f}s")
+        print(f"{'query':>16} {'LIKE ms':>9} {'FTS ms':>8}")
+        for q in ("warden north", "kingslayer", "character 4242"):
+            patterns = [f"%{term}%" for term in q.split()]
+            like_ms = timed(lambda: db.query(models.Character.id).filter(*(
+                models.Character.titles.ilike(pattern) | models.Character.name.ilike(pattern)
+                for pattern in patterns
+            )).limit(20).all())
+            fts_ms = timed(lambda: search.search(db, q, limit=20))
+            print(f"{q:>16} {like_ms:>9.1f} {fts_ms:>8.1f}")
+    os.remove(path)
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,61 @@
+"""CPU per request of GET /houses/?limit=1000 with the default and the FAST_JSON encoders.
+
+The house cache is disabled so every request loads and encodes the page.
+
+    python -m benchmarks.serialization [requests] [members_per_house]
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}")
+
+from benchmarks.asgi import request  # noqa: E402
+from src import cache, crud, migrations, schemas  # noqa: E402
+from src import main as api  # noqa: E402
+from src.database import SessionLocal, engine  # noqa: E402
+
+PATH = "/houses/?limit=1000"
+
+
+def seed(members: int):
+    migrations.upgrade(engine)
+    rows = [
+        schemas.HouseImport(
+            name=f"House {i}",
+            words="Winter is coming",
+            description="A noble house of Westeros.",
+            members=[schemas.CharacterBase(name=f"Member {i}.{j}", titles="Lord") for j in range(members)]
+        )
+        for i in range(1000)
+    ]
+    with SessionLocal() as db:
+        crud.import_houses(db, rows)
+
+
+async def measure(requests: int):
+    status, _, body = await request(api.app, "GET", PATH)
+    assert status == 200
+    cpu, wall = time.process_time(), time.perf_counter()
+    for _ in range(requests):
+        await request(api.app, "GET", PATH)
+    return (time.process_time() - cpu) / requests * 1000, (time.perf_counter() - wall) / requests * 1000, len(body)
+
+
+def main(requests: int = 20, members: int = 5):
+    seed(members)
+    cache.houses = cache.HouseCache(maxsize=0)
+    print(f"{'encoder':>10} {'cpu ms/req':>11} {'wall ms/req':>12} {'bytes':>9}")
+    results = {}
+    for name, fast_json in (("default", False), ("fast", True)):
+        api.FAST_JSON = fast_json
+        results[name] = asyncio.run(measure(requests))
+        cpu, wall, size = results[name]
+        print(f"{name:>10} {cpu:>11.1f} {wall:>12.1f} {size:>9}")
+    print(f"CPU saved per request: {results['default'][0] - results['fast'][0]:.1f} ms")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
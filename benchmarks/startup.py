@@ -0,0 +1,55 @@
+"""Cold start of a worker: import time and time to the first response, each in a fresh interpreter.
+
+    python -m benchmarks.startup [runs]
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+from pathlib import Path
+
+
+STARTUP_SCRIPT = """
+import json, sys, time
+import requests  # used by the test client only
+start = time.perf_counter()
+from src.main import app
+imported = time.perf_counter()
+from starlette.testclient import TestClient
+with TestClient(app) as client:
+    status = client.get('/').status_code
+    responded = time.perf_counter()
+print(json.dumps({'import': imported - start, 'first_response': responded - start, 'status': status}))
+"""
+
+
+def cold_start(database_url: str):
+    env = dict(os.environ, DATABASE_URL=database_url, DB_MIGRATE_ON_STARTUP='true')
+    output = subprocess.run(
+        [sys.executable, '-c', STARTUP_SCRIPT],
+        cwd=Path(__file__).parents[1], env=env, capture_output=True, check=True, text=True
+    ).stdout
+    startup = json.loads(output.splitlines()[-1])
+    assert startup['status'] == 200
+    return startup
+
+
+def main(runs: int = 10):
+    directory = tempfile.mkdtemp()
+    # The first run creates the database, the rest start against a migrated one
+    first = cold_start(f"sqlite:///{os.path.join(directory, 'startup.db')}")
+    rest = [cold_start(f"sqlite:///{os.path.join(directory, 'startup.db')}") for _ in range(runs - 1)]
+    print(f"{'':>14} {'import ms':>10} {'first response ms':>18}")
+    print(f"{'fresh db':>14} {first['import'] * 1000:>10.0f} {first['first_response'] * 1000:>18.0f}")
+    if rest:
+        print(
+            f"{'migrated db':>14} {statistics.median(run['import'] for run in rest) * 1000:>10.0f}"
+            f" {statistics.median(run['first_response'] for run in rest) * 1000:>18.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,157 @@
+"""Load test of the main endpoints against a freshly seeded SQLite database.
+
+Each scenario runs `--clients` concurrent clients issuing `--requests` requests
+apiece through the ASGI `app`, and reports requests per second and latency
+percentiles. Results can be written as JSON and compared with an earlier run:
+
+    python -m benchmarks.suite --houses 1000 --clients 50 --output after.json --baseline before.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}")
+
+import sqlalchemy  # noqa: E402
+
+from benchmarks.asgi import percentile, request, timed_request  # noqa: E402
+from src import crud, migrations, models, schemas  # noqa: E402
+from src.database import SessionLocal, engine  # noqa: E402
+from src.main import app  # noqa: E402
+
+
+EMAIL, PASSWORD = "bench@mail.com", "secret"
+
+
+def seed(houses: int, members: int):
+    migrations.upgrade(engine)
+    rows = [
+        schemas.HouseImport(
+            name=f"House {i}", members=[schemas.CharacterBase(name=f"Member {i}.{j}") for j in range(members)]
+        )
+        for i in range(houses)
+    ]
+    with SessionLocal() as db:
+        crud.import_houses(db, rows)
+        if crud.read_user_by_email(db, EMAIL) is None:
+            crud.create_user(db, schemas.UserCreate(email=EMAIL, password=PASSWORD))
+        crud.read_user_by_email(db, EMAIL).scopes = "houses:read houses:write"
+        db.commit()
+        return [house_id for house_id, in db.query(models.House.id)]
+
+
+async def login_token():
+    status, _, body = await request(app, "POST", "/login", form={"username": EMAIL, "password": PASSWORD})
+    assert status == 200, body
+    return json.loads(body)["access_token"]
+
+
+def scenarios(house_ids, token):
+    """name: function(rng) -> (method, path, request kwargs)"""
+    auth = {"authorization": f"Bearer {token}"}
+    pages = max(1, len(house_ids) // 20)
+    return {
+        "login": lambda rng: ("POST", "/login", {"form": {"username": EMAIL, "password": PASSWORD}}),
+        "house_read": lambda rng: ("GET", f"/houses/House {rng.randrange(len(house_ids))}", {}),
+        "house_list": lambda rng: ("GET", f"/houses/?skip={20 * rng.randrange(pages)}&limit=20", {}),
+        "member_create": lambda rng: (
+            "POST",
+            f"/houses/{rng.choice(house_ids)}/members/",
+            {
+                "headers": dict(auth, **{"content-type": "application/json"}),
+                "body": json.dumps({"name": f"Recruit {rng.random()}"}).encode()
+            }
+        ),
+    }
+
+
+async def client(make_request, requests: int, seed: int, latencies: list, statuses: list):
+    rng = random.Random(seed)
+    for _ in range(requests):
+        method, path, kwargs = make_request(rng)
+        status, latency = await timed_request(app, method, path, **kwargs)
+        statuses.append(status)
+        latencies.append(latency)
+
+
+async def run(make_request, clients: int, requests: int):
+    latencies, statuses = [], []
+    start = time.perf_counter()
+    await asyncio.gather(*(client(make_request, requests, i, latencies, statuses) for i in range(clients)))
+    elapsed = time.perf_counter() - start
+    return {
+        "requests": len(latencies),
+        "errors": sum(status >= 400 for status in statuses),
+        "rps": len(latencies) / elapsed,
+        "p50_ms": percentile(latencies, 50),
+        "p95_ms": percentile(latencies, 95),
+        "p99_ms": percentile(latencies, 99),
+        "max_ms": max(latencies),
+    }
+
+
+def print_results(results: dict, baseline: dict):
+    print(f"{'scenario':>14} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    for name, result in results.items():
+        line = (
+            f"{name:>14} {result['rps']:>8.0f} {result['p50_ms']:>8.1f}"
+            f" {result['p95_ms']:>8.1f} {result['p99_ms']:>8.1f} {result['errors']:>7}"
+        )
+        before = baseline.get(name)
+        if before:
+            line += f"   req/s {change(before['rps'], result['rps'])}, p95 {change(before['p95_ms'], result['p95_ms'])}"
+        print(line)
+
+
+def change(before: float, after: float):
+    return f"{(after - before) / before:+.0%}" if before else "n/a"
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--houses", type=int, default=1000, help="houses to seed")
+    parser.add_argument("--members", type=int, default=5, help="members seeded per house")
+    parser.add_argument("--clients", type=int, default=50, help="concurrent clients per scenario")
+    parser.add_argument("--requests", type=int, default=20, help="requests per client")
+    parser.add_argument("--scenario", action="append", help="run only these scenarios (repeatable)")
+    parser.add_argument("--output", help="write results to this JSON file")
+    parser.add_argument("--baseline", help="JSON results of an earlier run to compare with")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    house_ids = seed(args.houses, args.members)
+    token = asyncio.run(login_token())
+    available = scenarios(house_ids, token)
+    names = args.scenario or list(available)
+    unknown = set(names) - set(available)
+    if unknown:
+        sys.exit(f"unknown scenarios: {', '.join(sorted(unknown))} (choose from {', '.join(available)})")
+    results = {name: asyncio.run(run(available[name], args.clients, args.requests)) for name in names}
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+    print_results(results, baseline)
+    if args.output:
+        report = {
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "sqlalchemy": sqlalchemy.__version__,
+            "options": {key: value for key, value in vars(args).items() if key not in ("output", "baseline")},
+            "results": results,
+        }
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
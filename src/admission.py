@@ -0,0 +1,176 @@
+"""Admission control: a per-worker concurrency limit with a bounded, prioritized wait queue.
+
+Requests beyond `max_concurrency` wait in a queue ordered by the priority of
+their route class, then arrival. A request is shed with a 503 and Retry-After
+when the queue is full and holds nothing of lower priority to displace, or
+when it has waited `queue_timeout` seconds, so an overloaded worker answers
+fast instead of letting every request time out.
+"""
+import asyncio
+import heapq
+import itertools
+import os
+import time
+
+from typing import Callable, Dict, List, Optional
+
+from starlette.responses import JSONResponse
+
+from . import metrics
+
+
+ADMISSION_MAX_CONCURRENCY = int(os.environ.get('ADMISSION_MAX_CONCURRENCY') or 0)
+ADMISSION_MAX_QUEUE = int(os.environ.get('ADMISSION_MAX_QUEUE') or 100)
+ADMISSION_QUEUE_TIMEOUT = float(os.environ.get('ADMISSION_QUEUE_TIMEOUT') or 1)
+ADMISSION_RETRY_AFTER = int(os.environ.get('ADMISSION_RETRY_AFTER') or 1)
+# Route classes, most urgent first
+ADMISSION_PRIORITIES = (os.environ.get('ADMISSION_PRIORITIES') or 'read,write,auth,bulk').split(',')
+
+EXEMPT_PATHS = ("/metrics", "/stats/")
+AUTH_ROUTES = {("POST", "/login"), ("POST", "/users/")}
+BULK_ROUTES = {("GET", "/houses/export"), ("POST", "/houses/import")}
+
+
+def route_class(scope) -> Optional[str]:
+    """The class a request is admitted under, or None if it bypasses admission control."""
+    method, path = scope["method"], scope["path"]
+    if path.startswith(EXEMPT_PATHS):
+        return None
+    if (method, path) in AUTH_ROUTES:
+        return "auth"
+    if (method, path) in BULK_ROUTES:
+        return "bulk"
+    return "read" if method in ("GET", "HEAD") else "write"
+
+
+class Shed(Exception):
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+
+class AdmissionController:
+    """Hands out at most `max_concurrency` slots; waiters are served by priority, lowest number first.
+
+    Slots are handed directly from a finishing request to the next waiter, so a
+    request that arrives while others wait cannot jump the queue.
+    """
+
+    def __init__(self, max_concurrency: int, max_queue: int = 100, queue_timeout: float = 1):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.in_flight = 0
+        self._waiters: List[list] = []
+        self._arrivals = itertools.count()
+
+    @property
+    def queued(self):
+        return len(self._waiters)
+
+    async def acquire(self, priority: int, name: str = ""):
+        if self.in_flight < self.max_concurrency and not self._waiters:
+            self.in_flight += 1
+            return
+        if len(self._waiters) >= self.max_queue:
+            self._displace(priority)
+        future = asyncio.get_running_loop().create_future()
+        waiter = [priority, next(self._arrivals), future, name]
+        heapq.heappush(self._waiters, waiter)
+        try:
+            await asyncio.wait_for(future, self.queue_timeout)
+        except asyncio.TimeoutError:
+            if not self._withdraw(waiter):
+                raise Shed("timeout")
+        except asyncio.CancelledError:
+            if self._withdraw(waiter):
+                self.release()
+            raise
+
+    def release(self):
+        while self._waiters:
+            future = heapq.heappop(self._waiters)[2]
+            if not future.done():
+                future.set_result(None)
+                return
+        self.in_flight -= 1
+
+    def _displace(self, priority: int):
+        """Shed the newest waiter of the lowest priority to make room, or this request if none ranks below it."""
+        if not self._waiters:
+            raise Shed("queue_full")
+        last = max(self._waiters, key=lambda waiter: waiter[:2])
+        if last[0] <= priority:
+            raise Shed("queue_full")
+        self._remove(last)
+        last[2].set_exception(Shed("displaced"))
+
+    def _withdraw(self, waiter: list) -> bool:
+        """Take a waiter out of the queue; True if it had already been handed a slot."""
+        future = waiter[2]
+        if any(other is waiter for other in self._waiters):
+            self._remove(waiter)
+            return False
+        return future.done() and not future.cancelled() and future.exception() is None
+
+    def _remove(self, waiter: list):
+        self._waiters = [other for other in self._waiters if other is not waiter]
+        heapq.heapify(self._waiters)
+
+    def stats(self):
+        queued: Dict[str, int] = {}
+        for waiter in self._waiters:
+            queued[waiter[3]] = queued.get(waiter[3], 0) + 1
+        return {
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "in_flight": self.in_flight,
+            "queued": queued
+        }
+
+
+class AdmissionMiddleware:
+    """Admits requests through an `AdmissionController`, answering shed ones with 503 and Retry-After."""
+
+    def __init__(
+        self,
+        app,
+        get_controller: Callable[[], AdmissionController],
+        classify: Callable = route_class,
+        priorities: List[str] = ADMISSION_PRIORITIES,
+        retry_after: int = 1
+    ):
+        self.app = app
+        self.get_controller = get_controller
+        self.classify = classify
+        self.priorities = {name: priority for priority, name in enumerate(priorities)}
+        self.retry_after = retry_after
+
+    async def __call__(self, scope, receive, send):
+        controller = self.get_controller()
+        if scope["type"] != "http" or controller.max_concurrency <= 0:
+            return await self.app(scope, receive, send)
+        name = self.classify(scope)
+        if name is None:
+            return await self.app(scope, receive, send)
+        start = time.perf_counter()
+        try:
+            await controller.acquire(self.priorities.get(name, len(self.priorities)), name)
+        except Shed as shed:
+            metrics.admission_shed.labels(name, shed.reason).inc()
+            response = JSONResponse(
+                {"detail": "Server is overloaded, try again later"},
+                status_code=503,
+                headers={"Retry-After": str(self.retry_after)}
+            )
+            return await response(scope, receive, send)
+        metrics.admission_wait.labels(name).observe(time.perf_counter() - start)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            controller.release()
+
+
+controller = AdmissionController(
+    ADMISSION_MAX_CONCURRENCY, max_queue=ADMISSION_MAX_QUEUE, queue_timeout=ADMISSION_QUEUE_TIMEOUT
+)
@@ -0,0 +1,99 @@
+import asyncio
+import os
+
+from typing import Callable, List, Optional, Set, Tuple
+
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from . import cache, crud, schemas
+from .database import SessionLocal
+
+
+MEMBER_WRITE_BATCH_WINDOW = float(os.environ.get('MEMBER_WRITE_BATCH_WINDOW') or 0)
+MEMBER_WRITE_BATCH_SIZE = int(os.environ.get('MEMBER_WRITE_BATCH_SIZE') or 100)
+
+
+class MemberWriteBatcher:
+    """Commits member inserts that arrive close together in one transaction.
+
+    The first insert opens a batch, which is written `window` seconds later, or
+    as soon as it holds `max_size` inserts, by `crud.insert_house_members` on a
+    session of its own. If the batch fails, its members are retried one by one,
+    so each caller gets back its own row, None if its house does not exist, or
+    the exception its own insert raised.
+    """
+
+    def __init__(self, session_factory: Callable[[], Session], window: float = 0.005, max_size: int = 100):
+        self.session_factory = session_factory
+        self.window = window
+        self.max_size = max_size
+        self._pending: List[Tuple[int, schemas.CharacterBase, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        # The loop only keeps weak references to tasks
+        self._writes: Set[asyncio.Task] = set()
+
+    async def add(self, house_id: int, character: schemas.CharacterBase):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((house_id, character, future))
+        if len(self._pending) >= self.max_size:
+            self.flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self.flush)
+        return await future
+
+    def flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.ensure_future(self._write(batch))
+            self._writes.add(task)
+            task.add_done_callback(self._writes.discard)
+
+    async def _write(self, batch):
+        try:
+            rows = await run_in_threadpool(self._commit, [(house_id, character) for house_id, character, _ in batch])
+        except Exception as exc:
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(exc)
+        else:
+            for (_, _, future), row in zip(batch, rows):
+                if future.done():
+                    continue
+                if isinstance(row, Exception):
+                    future.set_exception(row)
+                else:
+                    future.set_result(row)
+
+    def _commit(self, members):
+        """Each member's row or None, or the exception its own insert raised."""
+        with self.session_factory() as db:
+            try:
+                rows, house_ids = crud.insert_house_members(db, members)
+            except Exception:
+                db.rollback()
+                if len(members) == 1:
+                    raise
+            else:
+                # Committed: a failing invalidation must not send the rows through the retry
+                for house_id in house_ids:
+                    cache.houses.house_updated(house_id)
+                return rows
+        return [self._commit_one(house_id, character) for house_id, character in members]
+
+    def _commit_one(self, house_id: int, character: schemas.CharacterBase):
+        with self.session_factory() as db:
+            try:
+                return crud.create_house_member(db, character, house_id)
+            except Exception as exc:
+                db.rollback()
+                return exc
+
+
+members: Optional[MemberWriteBatcher] = None
+if MEMBER_WRITE_BATCH_WINDOW > 0:
+    members = MemberWriteBatcher(SessionLocal, window=MEMBER_WRITE_BATCH_WINDOW, max_size=MEMBER_WRITE_BATCH_SIZE)
@@ -0,0 +1,215 @@
+import importlib
+import os
+import threading
+import time
+
+from collections import OrderedDict
+from typing import Any, Callable, FrozenSet, Hashable, Iterable, NamedTuple, Optional, Tuple
+
+
+PRINCIPAL_CACHE_SIZE = int(os.environ.get('PRINCIPAL_CACHE_SIZE') or 1024)
+PRINCIPAL_CACHE_TTL = float(os.environ.get('PRINCIPAL_CACHE_TTL') or 30)
+TOKEN_CACHE_SIZE = int(os.environ.get('TOKEN_CACHE_SIZE') or 1024)
+HOUSE_CACHE_SIZE = int(os.environ.get('HOUSE_CACHE_SIZE') or 1024)
+# "package.module:ClassName" of an InvalidationChannel shared by all workers
+HOUSE_CACHE_CHANNEL = os.environ.get('HOUSE_CACHE_CHANNEL')
+# Without a channel a worker only sees writes made through other workers once
+# its entries expire, so they are kept briefly by default
+HOUSE_CACHE_TTL = float(os.environ.get('HOUSE_CACHE_TTL') or (300 if HOUSE_CACHE_CHANNEL else 5))
+
+
+class TTLCache:
+    """Thread-safe LRU mapping whose entries expire `ttl` seconds after being set.
+
+    A cache with `maxsize` or `ttl` of 0 never stores anything.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 60, timer: Callable[[], float] = time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.timer = timer
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key: Hashable, default: Any = None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None:
+                value, expires = item
+                if expires > self.timer():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        if self.maxsize <= 0 or ttl <= 0:
+            return
+        with self._lock:
+            self._data[key] = (value, self.timer() + ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key: Hashable):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def evict(self, predicate: Callable[[Any], bool]):
+        """Drop every entry whose value satisfies `predicate`."""
+        with self._lock:
+            for key in [key for key, (value, _) in self._data.items() if predicate(value)]:
+                del self._data[key]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        return {"size": len(self), "maxsize": self.maxsize, "hits": self.hits, "misses": self.misses}
+
+
+class InvalidationChannel:
+    """Carries cache invalidations between workers.
+
+    Subclass it to plug in a broker: `publish` sends a JSON-serializable
+    message to every worker and `subscribe` registers the callback that applies
+    messages received from them.
+    """
+
+    def publish(self, message: dict):
+        raise NotImplementedError
+
+    def subscribe(self, callback: Callable[[dict], None]):
+        raise NotImplementedError
+
+
+class LocalChannel(InvalidationChannel):
+    """In-process stand-in for a broker, delivering to every subscriber."""
+
+    def __init__(self):
+        self.subscribers = []
+
+    def publish(self, message: dict):
+        for callback in list(self.subscribers):
+            callback(message)
+
+    def subscribe(self, callback: Callable[[dict], None]):
+        self.subscribers.append(callback)
+
+
+class TokenClaims(NamedTuple):
+    """What authorization needs from a verified access token."""
+
+    username: str
+    scopes: FrozenSet[str]
+
+
+class HouseEntry(NamedTuple):
+    """A serialized house or page of houses and the ids it was built from."""
+
+    body: bytes
+    etag: str
+    ids: Tuple[int, ...]
+    # (after_id, limit) for pages, None for a single house
+    page: Optional[Tuple[Optional[int], int]] = None
+
+    def affected_by_membership(self, house_id: int):
+        """Whether adding or removing `house_id` changes this entry."""
+        if house_id in self.ids:
+            return True
+        if self.page is None:
+            return False
+        after_id, limit = self.page
+        full = bool(self.ids) and len(self.ids) >= limit
+        return (after_id is None or house_id > after_id) and (not full or house_id <= self.ids[-1])
+
+
+class HouseCache:
+    """Serialized house responses, keyed by name and by page, evicted by house writes.
+
+    Reads must take `generation` before querying and pass it to `set`, so that
+    a response built from data older than the last invalidation is not stored.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 300, channel: Optional[InvalidationChannel] = None):
+        self.entries = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.channel = channel
+        self.generation = 0
+        self._lock = threading.Lock()
+        if channel is not None:
+            channel.subscribe(self.apply)
+
+    def get(self, key: Hashable) -> Optional[HouseEntry]:
+        return self.entries.get(key)
+
+    def set(self, key: Hashable, entry: HouseEntry, generation: int, ttl: Optional[float] = None):
+        with self._lock:
+            if generation == self.generation:
+                self.entries.set(key, entry, ttl)
+
+    def house_updated(self, house_id: int):
+        self._invalidate({"updated": [house_id]})
+
+    def houses_added_or_removed(self, house_ids: Iterable[int]):
+        self._invalidate({"membership": list(house_ids)})
+
+    def pages_reset(self):
+        self._invalidate({"pages": True})
+
+    def _invalidate(self, message: dict):
+        self.apply(message)
+        if self.channel is not None:
+            self.channel.publish(message)
+
+    def apply(self, message: dict):
+        updated = set(message.get("updated", ()))
+        membership = message.get("membership", ())
+        pages = message.get("pages", False)
+
+        def affected(entry: HouseEntry):
+            return (
+                (pages and entry.page is not None)
+                or not updated.isdisjoint(entry.ids)
+                or any(entry.affected_by_membership(house_id) for house_id in membership)
+            )
+
+        with self._lock:
+            self.generation += 1
+            self.entries.evict(affected)
+
+    def stats(self):
+        return self.entries.stats()
+
+
+def load_channel(path: Optional[str]):
+    if not path:
+        return None
+    module, _, name = path.partition(":")
+    return getattr(importlib.import_module(module), name)()
+
+
+# Verified users by email. Workers do not share it, so a user deleted or
+# deactivated through another worker stays authorized for up to the TTL.
+principals = TTLCache(maxsize=PRINCIPAL_CACHE_SIZE, ttl=PRINCIPAL_CACHE_TTL)
+
+# Verified claims by raw bearer token, each kept until the token's own expiry.
+tokens = TTLCache(maxsize=TOKEN_CACHE_SIZE, ttl=float("inf"))
+
+houses = HouseCache(
+    maxsize=HOUSE_CACHE_SIZE, ttl=HOUSE_CACHE_TTL, channel=load_channel(HOUSE_CACHE_CHANNEL)
+)
+
+caches = {"principals": principals, "tokens": tokens, "houses": houses}
+
+
+def stats():
+    return {name: cache.stats() for name, cache in caches.items()}
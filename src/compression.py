@@ -0,0 +1,153 @@
+"""Negotiated gzip/brotli compression of response bodies.
+
+Whole responses are compressed when they are at least `minimum_size` bytes;
+streaming responses are compressed chunk by chunk as they are sent. Strong
+ETags become weak on every response to a client that negotiated compression,
+so a 304 carries the same ETag as the compressed 200 it revalidates;
+`etags.etag_matches` compares them weakly.
+"""
+import os
+import zlib
+
+from typing import Dict, Optional, Sequence
+
+from starlette.datastructures import Headers, MutableHeaders
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - br is simply not offered without it
+    brotli = None
+
+
+# Server preference order; 'identity' turns compression off
+COMPRESSION_ENCODINGS = (os.environ.get('COMPRESSION_ENCODINGS') or 'br,gzip').replace(' ', '').split(',')
+COMPRESSION_MIN_SIZE = int(os.environ.get('COMPRESSION_MIN_SIZE') or 1024)
+COMPRESSION_GZIP_LEVEL = int(os.environ.get('COMPRESSION_GZIP_LEVEL') or 6)
+COMPRESSION_BROTLI_QUALITY = int(os.environ.get('COMPRESSION_BROTLI_QUALITY') or 4)
+
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "text/")
+
+
+class GzipCompressor:
+    def __init__(self, level: int = 6):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush()
+
+
+class BrotliCompressor:
+    def __init__(self, quality: int = 4):
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.process(data)
+
+    def finish(self) -> bytes:
+        return self._compressor.finish()
+
+
+def available_encodings(encodings: Sequence[str]):
+    return [encoding for encoding in encodings if encoding == "gzip" or (encoding == "br" and brotli is not None)]
+
+
+def choose_encoding(accept_encoding: str, encodings: Sequence[str]) -> Optional[str]:
+    """The encoding of `encodings` the client accepts with the highest q-value, earlier ones winning ties."""
+    weights: Dict[str, float] = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.partition(";")
+        weight = 1.0
+        for param in params.split(";"):
+            key, _, value = param.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    weight = float(value)
+                except ValueError:
+                    weight = 0.0
+        weights[name.strip().lower()] = weight
+    best, best_weight = None, 0.0
+    for encoding in encodings:
+        weight = weights.get(encoding, weights.get("*", 0.0))
+        if weight > best_weight:
+            best, best_weight = encoding, weight
+    return best
+
+
+class CompressionMiddleware:
+    """Compresses JSON, NDJSON and text responses with the best encoding the client accepts."""
+
+    def __init__(
+        self,
+        app,
+        encodings: Sequence[str] = COMPRESSION_ENCODINGS,
+        minimum_size: int = COMPRESSION_MIN_SIZE,
+        gzip_level: int = COMPRESSION_GZIP_LEVEL,
+        brotli_quality: int = COMPRESSION_BROTLI_QUALITY
+    ):
+        self.app = app
+        self.encodings = available_encodings(encodings)
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    def compressor(self, encoding: str):
+        if encoding == "br":
+            return BrotliCompressor(self.brotli_quality)
+        return GzipCompressor(self.gzip_level)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.encodings:
+            return await self.app(scope, receive, send)
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""), self.encodings)
+        if encoding is None:
+            return await self.app(scope, receive, send)
+
+        start_message = None
+        compressor = None
+
+        async def send_compressed(message):
+            nonlocal start_message, compressor
+            if message["type"] == "http.response.start":
+                start_message = message
+                return
+            if start_message is None:
+                return await send(message)
+            if message["type"] != "http.response.body":
+                return await send(message)
+
+            body, more_body = message.get("body", b""), message.get("more_body", False)
+            if compressor is None:
+                headers = MutableHeaders(raw=list(start_message["headers"]))
+                etag = headers.get("etag")
+                if etag and not etag.startswith("W/"):
+                    headers["etag"] = f"W/{etag}"
+                if (
+                    "content-encoding" in headers
+                    or not headers.get("content-type", "").startswith(COMPRESSIBLE_TYPES)
+                    or (not more_body and len(body) < self.minimum_size)
+                ):
+                    await send(dict(start_message, headers=headers.raw))
+                    start_message = None
+                    return await send(message)
+                compressor = self.compressor(encoding)
+                headers["content-encoding"] = encoding
+                headers.add_vary_header("Accept-Encoding")
+                if more_body:
+                    del headers["content-length"]
+                    await send(dict(start_message, headers=headers.raw))
+                else:
+                    body = compressor.compress(body) + compressor.finish()
+                    headers["content-length"] = str(len(body))
+                    await send(dict(start_message, headers=headers.raw))
+                    return await send({"type": "http.response.body", "body": body})
+
+            chunk = compressor.compress(body)
+            if not more_body:
+                chunk += compressor.finish()
+            if chunk or not more_body:
+                await send({"type": "http.response.body", "body": chunk, "more_body": more_body})
+
+        await self.app(scope, receive, send_compressed)
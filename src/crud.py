@@ -1,27 +1,94 @@
-from passlib.context import CryptContext
-from sqlalchemy.orm import Session
+import os
 
-from . import models, schemas
+from functools import lru_cache
+from itertools import groupby
+from typing import List, Optional, Sequence, Tuple
 
+from sqlalchemy import bindparam, func, insert, select, text
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, joinedload, selectinload
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+from . import cache, metrics, models, records, schemas, search
 
 
+BCRYPT_ROUNDS = int(os.environ.get('BCRYPT_ROUNDS') or 12)
+
+@lru_cache(maxsize=None)
+def pwd_context():
+    """The password hashing context, built on first use to keep passlib off the import path."""
+    from passlib.context import CryptContext
+
+    # Pinning min and max rounds makes hashes of any other cost need an update.
+    return CryptContext(
+        schemes=["bcrypt"],
+        deprecated="auto",
+        bcrypt__default_rounds=BCRYPT_ROUNDS,
+        bcrypt__min_rounds=BCRYPT_ROUNDS,
+        bcrypt__max_rounds=BCRYPT_ROUNDS
+    )
+
+
+members_loaders = {"selectin": selectinload, "joined": joinedload}
+
+
+class AlreadyExists(Exception):
+    """A write would duplicate a unique email or house name."""
+
+
+def insert_returning(db: Session, table, values: dict, conflict: Optional[str] = None):
+    """Insert one row and return it in the same statement, or None if `conflict` is taken.
+
+    SQLAlchemy 1.4 cannot compile RETURNING for SQLite, so the statement is
+    written out; it runs on SQLite 3.35+ and Postgres. Python-side column
+    defaults are applied, as the ORM would.
+    """
+    return insert_many_returning(db, table, [values], conflict).first()
+
+
+def insert_many_returning(db: Session, table, rows: List[dict], conflict: Optional[str] = None):
+    """Insert `rows`, which share their keys, in one statement and return the rows inserted, in no set order.
+
+    Rows whose `conflict` target is taken are skipped and not returned.
+    """
+    defaults = {column.name: column.default.arg for column in table.columns if column.default is not None}
+    rows = [dict(defaults, **values) for values in rows]
+    names = list(rows[0])
+    on_conflict = f" ON CONFLICT ({conflict}) DO NOTHING" if conflict else ""
+    statement = text(
+        f"INSERT INTO {table.name} ({', '.join(names)}) VALUES "
+        + ", ".join("(" + ", ".join(f":{name}_{i}" for name in names) + ")" for i in range(len(rows)))
+        + f"{on_conflict} RETURNING {', '.join(column.name for column in table.columns)}"
+    ).columns(*table.columns)
+    return db.execute(statement, {f"{name}_{i}": row[name] for i, row in enumerate(rows) for name in names})
+
+
+@metrics.timed(metrics.password_verify_duration)
 def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+    return pwd_context().verify(plain_password, hashed_password)
+
+
+@metrics.timed(metrics.password_verify_duration)
+def verify_and_update_password(plain_password, hashed_password):
+    """Return whether the password matches and, if its hash is outdated, a new hash."""
+    return pwd_context().verify_and_update(plain_password, hashed_password)
 
 
 def get_password_hash(password: str):
-    return pwd_context.hash(password)
+    return pwd_context().hash(password)
 
 
-def create_user(db: Session, user: schemas.UserCreate):
-    hashed_password = get_password_hash(user.password)
-    db_user = models.User(email=user.email, hashed_password=hashed_password)
-    db.add(db_user)
+def create_user(db: Session, user: schemas.UserCreate, hashed_password: Optional[str] = None):
+    """Insert a user and return its row; raise AlreadyExists if the email is registered."""
+    hashed_password = hashed_password or get_password_hash(user.password)
+    row = insert_returning(
+        db, models.User.__table__, {"email": user.email, "hashed_password": hashed_password}, conflict="email"
+    )
+    if row is None:
+        db.rollback()
+        raise AlreadyExists(user.email)
     db.commit()
-    db.refresh(db_user)
-    return db_user
+    return row
 
 
 def read_user(db: Session, user_id: int):
@@ -32,48 +99,530 @@ def read_user_by_email(db: Session, email: str):
     return db.query(models.User).filter(models.User.email == email).first()
 
 
-def read_users(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(models.User).offset(skip).limit(limit).all()
+async def async_read_user_by_email(db: AsyncSession, email: str):
+    result = await db.execute(select(models.User).filter(models.User.email == email).limit(1))
+    return result.scalars().first()
+
+
+def read_users(db: Session, skip: int = 0, limit: int = 100, after_id: Optional[int] = None):
+    query = db.query(models.User).order_by(models.User.id)
+    if after_id is not None:
+        return query.filter(models.User.id > after_id).limit(limit).all()
+    return query.offset(skip).limit(limit).all()
+
+
+def read_user_rows(db: Session, skip: int = 0, limit: int = 100, after_id: Optional[int] = None):
+    """Like `read_users`, as plain rows of the columns `schemas.User` exposes."""
+    stmt = select(models.User.id, models.User.email, models.User.is_active, models.User.scopes)
+    stmt = stmt.order_by(models.User.id)
+    if after_id is not None:
+        return db.execute(stmt.filter(models.User.id > after_id).limit(limit)).all()
+    return db.execute(stmt.offset(skip).limit(limit)).all()
+
+
+def update_password_hash(db: Session, user_id: int, hashed_password: str):
+    rows = db.query(models.User).filter(models.User.id == user_id).update({"hashed_password": hashed_password})
+    db.commit()
+    return rows
+
+
+def deactivate_user(db: Session, user_id: int):
+    rows = db.query(models.User).filter(models.User.id == user_id).update({"is_active": False})
+    db.commit()
+    cache.principals.evict(lambda principal: principal.id == user_id)
+    return rows
 
 
 def delete_user(db: Session, user_id: id):
     rows = db.query(models.User).filter(models.User.id == user_id).delete()
     db.commit()
+    cache.principals.evict(lambda principal: principal.id == user_id)
     return rows
 
 
 def create_house(db: Session, house: schemas.HouseBase):
-    db_house = models.House(**house.dict())
-    db.add(db_house)
+    """Insert a house and return its record; raise AlreadyExists if the name is registered."""
+    row = insert_returning(db, models.House.__table__, house.dict(), conflict="lower(name)")
+    if row is None:
+        db.rollback()
+        raise AlreadyExists(house.name)
+    search.add_house(db, row.id)
     db.commit()
-    db.refresh(db_house)
-    return db_house
+    cache.houses.houses_added_or_removed([row.id])
+    return house_record(row, [])
 
 
-def read_house_by_name(db: Session, name: str):
-    return db.query(models.House).filter(models.House.name == name).first()
+def house_named(name: str):
+    """Case-insensitive match of a house name, served by ix_houses_name_lower."""
+    return func.lower(models.House.name) == func.lower(name)
 
 
-def read_houses(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(models.House).offset(skip).limit(limit).all()
+def query_houses(db: Session, members: str = "selectin"):
+    loader = members_loaders[members]
+    return db.query(models.House).options(loader(models.House.members))
 
 
-def update_house(db: Session, house_id: int, house: schemas.HouseBase):
-    db.query(models.House).filter(models.House.id == house_id).update(house.dict())
+def read_house_by_name(db: Session, name: str, members: str = "joined"):
+    return query_houses(db, members).filter(house_named(name)).first()
+
+
+def read_houses(
+    db: Session,
+    skip: int = 0,
+    limit: int = 100,
+    members: str = "selectin",
+    after_id: Optional[int] = None
+):
+    query = query_houses(db, members).order_by(models.House.id)
+    if after_id is not None:
+        return query.filter(models.House.id > after_id).limit(limit).all()
+    return query.offset(skip).limit(limit).all()
+
+
+def select_houses(members: str = "selectin"):
+    loader = members_loaders[members]
+    return select(models.House).options(loader(models.House.members))
+
+
+async def async_read_house_by_name(db: AsyncSession, name: str, members: str = "joined"):
+    result = await db.execute(select_houses(members).filter(house_named(name)))
+    return result.unique().scalars().first()
+
+
+def paginate_houses(stmt, skip: int = 0, limit: int = 100, after_id: Optional[int] = None):
+    stmt = stmt.order_by(models.House.id)
+    if after_id is not None:
+        return stmt.filter(models.House.id > after_id).limit(limit)
+    return stmt.offset(skip).limit(limit)
+
+
+async def async_read_houses(
+    db: AsyncSession,
+    skip: int = 0,
+    limit: int = 100,
+    members: str = "selectin",
+    after_id: Optional[int] = None
+):
+    result = await db.execute(paginate_houses(select_houses(members), skip, limit, after_id))
+    return result.unique().scalars().all()
+
+
+house_columns = ("name", "words", "description")
+
+
+def select_house_versions(columns: Sequence[str] = house_columns):
+    """Select the id and version of houses and the other `columns` of their representation.
+
+    By default these are every column that identifies the representation, without its members.
+    """
+    return select(models.House.id, models.House.version, *(getattr(models.House, column) for column in columns))
+
+
+def read_house_version(db: Session, name: str):
+    return db.execute(select_house_versions().filter(house_named(name))).first()
+
+
+async def async_read_house_version(db: AsyncSession, name: str):
+    result = await db.execute(select_house_versions().filter(house_named(name)))
+    return result.first()
+
+
+def read_houses_versions(db: Session, skip: int = 0, limit: int = 100, after_id: Optional[int] = None):
+    return db.execute(paginate_houses(select_house_versions(), skip, limit, after_id)).all()
+
+
+async def async_read_houses_versions(
+    db: AsyncSession,
+    skip: int = 0,
+    limit: int = 100,
+    after_id: Optional[int] = None
+):
+    result = await db.execute(paginate_houses(select_house_versions(), skip, limit, after_id))
+    return result.all()
+
+
+member_columns = (
+    models.Character.id.label("member_id"),
+    models.Character.name.label("member_name"),
+    models.Character.titles.label("member_titles"),
+    models.Character.description.label("member_description")
+)
+
+
+def select_with_members(houses):
+    """Outer-join a select of house version columns to their members, one row per member."""
+    houses = houses.subquery()
+    return (
+        select(houses, *member_columns)
+        .outerjoin(models.Character, models.Character.house_id == houses.c.id)
+        .order_by(houses.c.id, models.Character.id)
+    )
+
+
+# House ids per members statement, as selectinload batches them; keeps pages
+# with a large limit under SQLite's limit on bound variables
+MEMBERS_BATCH_SIZE = 500
+
+
+def select_members(house_ids: List[int]):
+    return (
+        select(models.Character.house_id, *member_columns)
+        .filter(models.Character.house_id.in_(house_ids))
+        .order_by(models.Character.id)
+    )
+
+
+def select_members_batches(house_ids: List[int]):
+    return [
+        select_members(house_ids[start:start + MEMBERS_BATCH_SIZE])
+        for start in range(0, len(house_ids), MEMBERS_BATCH_SIZE)
+    ]
+
+
+def house_record(row, members: Optional[list] = None):
+    """A record of the house columns in `row`; the ones it did not select are None."""
+    return records.HouseRecord(
+        id=row.id,
+        version=row.version,
+        name=getattr(row, "name", None),
+        words=getattr(row, "words", None),
+        description=getattr(row, "description", None),
+        members=members
+    )
+
+
+def member_record(row, house_id: int):
+    return records.CharacterRecord(
+        id=row.member_id,
+        name=row.member_name,
+        titles=row.member_titles,
+        description=row.member_description,
+        house_id=house_id
+    )
+
+
+def joined_house_records(rows):
+    houses = []
+    for house_id, group in groupby(rows, key=lambda row: row.id):
+        group = list(group)
+        members = [member_record(row, house_id) for row in group if row.member_id is not None]
+        houses.append(house_record(group[0], members))
+    return houses
+
+
+def house_records_with_members(house_rows, member_rows):
+    houses = {row.id: house_record(row, []) for row in house_rows}
+    for row in member_rows:
+        houses[row.house_id].members.append(member_record(row, row.house_id))
+    return list(houses.values())
+
+
+def load_house_records(db: Session, houses, members: Optional[str] = "selectin"):
+    """Run a select of house version columns and attach each house's members.
+
+    `members="joined"` reads the houses and their members in one statement,
+    `None` leaves the members unread (and `members` None), otherwise the
+    members are read by a second statement.
+    """
+    if members is None:
+        return [house_record(row) for row in db.execute(houses)]
+    if members == "joined":
+        return joined_house_records(db.execute(select_with_members(houses)))
+    house_rows = db.execute(houses).all()
+    member_rows = [
+        row for stmt in select_members_batches([row.id for row in house_rows]) for row in db.execute(stmt)
+    ]
+    return house_records_with_members(house_rows, member_rows)
+
+
+async def async_load_house_records(db: AsyncSession, houses, members: Optional[str] = "selectin"):
+    if members is None:
+        return [house_record(row) for row in await db.execute(houses)]
+    if members == "joined":
+        return joined_house_records(await db.execute(select_with_members(houses)))
+    house_rows = (await db.execute(houses)).all()
+    member_rows = [
+        row for stmt in select_members_batches([row.id for row in house_rows]) for row in await db.execute(stmt)
+    ]
+    return house_records_with_members(house_rows, member_rows)
+
+
+def read_house_records(
+    db: Session,
+    skip: int = 0,
+    limit: int = 100,
+    members: Optional[str] = "selectin",
+    after_id: Optional[int] = None,
+    columns: Sequence[str] = house_columns
+):
+    """Like `read_houses`, as `HouseRecord`s loaded with Core selects of only the `columns` asked for."""
+    page = paginate_houses(select_house_versions(columns), skip, limit, after_id)
+    return load_house_records(db, page, members)
+
+
+async def async_read_house_records(
+    db: AsyncSession,
+    skip: int = 0,
+    limit: int = 100,
+    members: Optional[str] = "selectin",
+    after_id: Optional[int] = None,
+    columns: Sequence[str] = house_columns
+):
+    page = paginate_houses(select_house_versions(columns), skip, limit, after_id)
+    return await async_load_house_records(db, page, members)
+
+
+def read_house_record_by_name(
+    db: Session,
+    name: str,
+    members: Optional[str] = "joined",
+    columns: Sequence[str] = house_columns
+):
+    house = select_house_versions(columns).filter(house_named(name))
+    houses = load_house_records(db, house, members)
+    return houses[0] if houses else None
+
+
+async def async_read_house_record_by_name(
+    db: AsyncSession,
+    name: str,
+    members: Optional[str] = "joined",
+    columns: Sequence[str] = house_columns
+):
+    house = select_house_versions(columns).filter(house_named(name))
+    houses = await async_load_house_records(db, house, members)
+    return houses[0] if houses else None
+
+
+def escape_like(value: str):
+    """Escape LIKE wildcards in `value`, for patterns using `escape="\\"`."""
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def select_house_members(
+    house_id: int,
+    skip: int = 0,
+    limit: int = 100,
+    after_id: Optional[int] = None,
+    name: Optional[str] = None
+):
+    """Select a page of a house's members in id order, optionally those whose name contains `name`."""
+    stmt = select(
+        models.Character.id,
+        models.Character.name,
+        models.Character.titles,
+        models.Character.description,
+        models.Character.house_id
+    ).filter(models.Character.house_id == house_id).order_by(models.Character.id)
+    if name:
+        stmt = stmt.filter(models.Character.name.ilike(f"%{escape_like(name)}%", escape="\\"))
+    if after_id is not None:
+        return stmt.filter(models.Character.id > after_id).limit(limit)
+    return stmt.offset(skip).limit(limit)
+
+
+def read_house_members(
+    db: Session,
+    house_id: int,
+    skip: int = 0,
+    limit: int = 100,
+    after_id: Optional[int] = None,
+    name: Optional[str] = None
+):
+    return db.execute(select_house_members(house_id, skip, limit, after_id, name)).all()
+
+
+async def async_read_house_members(
+    db: AsyncSession,
+    house_id: int,
+    skip: int = 0,
+    limit: int = 100,
+    after_id: Optional[int] = None,
+    name: Optional[str] = None
+):
+    result = await db.execute(select_house_members(house_id, skip, limit, after_id, name))
+    return result.all()
+
+
+def house_exists(db: Session, house_id: int):
+    return db.execute(select(models.House.id).filter(models.House.id == house_id)).first() is not None
+
+
+async def async_house_exists(db: AsyncSession, house_id: int):
+    result = await db.execute(select(models.House.id).filter(models.House.id == house_id))
+    return result.first() is not None
+
+
+def stream_houses(db: Session, batch_size: int = 1000):
+    """Yield every house as a dict with its members, reading through a server-side cursor."""
+    rows = (
+        db.query(
+            models.House.id,
+            models.House.name,
+            models.House.words,
+            models.House.description,
+            models.Character.id.label("member_id"),
+            models.Character.name.label("member_name"),
+            models.Character.titles.label("member_titles"),
+            models.Character.description.label("member_description")
+        )
+        .outerjoin(models.House.members)
+        .order_by(models.House.id, models.Character.id)
+        .yield_per(batch_size)
+    )
+    for _, group in groupby(rows, key=lambda row: row.id):
+        group = list(group)
+        house = group[0]
+        yield {
+            "name": house.name,
+            "words": house.words,
+            "description": house.description,
+            "id": house.id,
+            "members": [
+                {
+                    "name": row.member_name,
+                    "titles": row.member_titles,
+                    "description": row.member_description,
+                    "id": row.member_id,
+                    "house_id": house.id
+                }
+                for row in group if row.member_id is not None
+            ]
+        }
+
+
+def _update_house(db: Session, where: str, house: schemas.HouseBase, **params):
+    table = models.House.__table__
+    statement = text(
+        "UPDATE houses SET name = :name, words = :words, description = :description, version = version + 1 "
+        f"WHERE {where} RETURNING {', '.join(column.name for column in table.columns)}"
+    ).columns(*table.columns)
+    try:
+        row = db.execute(statement, dict(house.dict(), **params)).first()
+    except IntegrityError:
+        db.rollback()
+        raise AlreadyExists(house.name)
+    if row is None:
+        db.rollback()
+        return None
+    search.index_houses(db, [row.id])
+    members = db.execute(select_members([row.id])).all()
     db.commit()
-    return db.query(models.House).filter(models.House.id == house_id).first()
+    cache.houses.house_updated(row.id)
+    return house_records_with_members([row], members)[0]
+
+
+def update_house(db: Session, house_id: int, house: schemas.HouseBase):
+    """Replace a house's fields and return its record, or None if there is no such house.
+
+    Raises AlreadyExists if the new name belongs to another house.
+    """
+    return _update_house(db, "id = :house_id", house, house_id=house_id)
+
+
+def update_house_by_name(db: Session, name: str, house: schemas.HouseBase):
+    return _update_house(db, "lower(name) = lower(:current_name)", house, current_name=name)
 
 
 def create_house_member(db: Session, character: schemas.CharacterBase, house_id: int):
-    db_character = models.Character(**character.dict(), house_id=house_id)
-    db.add(db_character)
+    """Insert a member and return its row, or None if there is no such house."""
+    return create_house_members(db, [(house_id, character)])[0]
+
+
+def create_house_members(db: Session, members: Sequence[Tuple[int, schemas.CharacterBase]]):
+    """Insert `(house_id, character)` pairs in one transaction, with a single commit.
+
+    Returns each member's row in order, or None where its house does not exist.
+    """
+    rows, house_ids = insert_house_members(db, members)
+    for house_id in house_ids:
+        cache.houses.house_updated(house_id)
+    return rows
+
+
+def insert_house_members(db: Session, members: Sequence[Tuple[int, schemas.CharacterBase]]):
+    """`create_house_members` without the cache invalidation, which is left to the caller.
+
+    Returns the rows and the ids of the houses that gained members.
+    """
+    house_ids = sorted({house_id for house_id, _ in members})
+    bumped = db.execute(
+        text("UPDATE houses SET version = version + 1 WHERE id IN :ids RETURNING id").bindparams(
+            bindparam("ids", expanding=True)
+        ),
+        {"ids": house_ids}
+    )
+    found = {house_id for house_id, in bumped}
+    if not found:
+        db.rollback()
+        return [None] * len(members), found
+    rows = [
+        insert_returning(db, models.Character.__table__, dict(character.dict(), house_id=house_id))
+        if house_id in found else None
+        for house_id, character in members
+    ]
+    search.add_characters(db, [row.id for row in rows if row is not None])
+    db.commit()
+    return rows, found
+
+
+def import_houses(db: Session, houses: List[schemas.HouseImport], batch_size: int = 500):
+    """Insert houses and their members in one transaction, `batch_size` houses per statement.
+
+    Houses whose name is already registered, or repeated earlier in `houses`,
+    are skipped and reported by their position in `houses`.
+    """
+    result = schemas.HouseImportResult()
+    seen = set()
+    for start in range(0, len(houses), batch_size):
+        batch = []
+        for index, house in enumerate(houses[start:start + batch_size], start):
+            if house.name.lower() in seen:
+                result.errors.append(schemas.HouseImportError(index=index, detail="House already registered"))
+                continue
+            seen.add(house.name.lower())
+            batch.append((index, house))
+        if not batch:
+            continue
+        # Names registered before, or concurrently, come back missing
+        house_ids = {
+            row.name.lower(): row.id for row in insert_many_returning(
+                db, models.House.__table__, [house.dict(exclude={"members"}) for _, house in batch],
+                conflict="lower(name)"
+            )
+        }
+        new_houses = []
+        for index, house in batch:
+            if house.name.lower() in house_ids:
+                new_houses.append(house)
+            else:
+                result.errors.append(schemas.HouseImportError(index=index, detail="House already registered"))
+        if not new_houses:
+            continue
+        members = [
+            dict(member.dict(), house_id=house_ids[house.name.lower()])
+            for house in new_houses for member in house.members
+        ]
+        if members:
+            db.execute(insert(models.Character), members)
+        search.index_houses(db, house_ids.values())
+        search.index_members(db, house_ids.values())
+        result.houses += len(new_houses)
+        result.members += len(members)
     db.commit()
-    db.refresh(db_character)
-    return db_character
+    result.errors.sort(key=lambda error: error.index)
+    if result.houses:
+        cache.houses.pages_reset()
+    return result
 
 
 def delete_house(db: Session, house_id: id):
+    """Delete a house together with its members and their search documents."""
+    search.remove_members_of(db, [house_id])
+    db.query(models.Character).filter(models.Character.house_id == house_id).delete()
     rows = db.query(models.House).filter(models.House.id == house_id).delete()
+    search.remove_houses(db, [house_id])
     db.commit()
+    cache.houses.houses_added_or_removed([house_id])
     return rows
 
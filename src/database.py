@@ -1,29 +1,162 @@
 import os
 
+from typing import Optional
+
+from fastapi import Request
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
+from .metrics import PoolStats, TimedAsyncQueuePool, TimedQueuePool, instrument_engine
+from .replicas import Replica, ReplicaSet, wrote_recently
+
+
+DATABASE_ASYNC = (os.environ.get('DATABASE_ASYNC') or '').lower() in ('1', 'true', 'yes')
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE') or 5)
+DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW') or 10)
+DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT') or 30)
+DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE') or -1)
+DB_POOL_PRE_PING = (os.environ.get('DB_POOL_PRE_PING') or '').lower() in ('1', 'true', 'yes')
+DATABASE_REPLICA_URLS = [url for url in (os.environ.get('DATABASE_REPLICA_URLS') or '').split(',') if url.strip()]
+DB_REPLICA_MAX_LAG = float(os.environ.get('DB_REPLICA_MAX_LAG') or 5)
+DB_REPLICA_CHECK_INTERVAL = float(os.environ.get('DB_REPLICA_CHECK_INTERVAL') or 5)
+DB_REPLICA_STICKY_SECONDS = float(os.environ.get('DB_REPLICA_STICKY_SECONDS') or 5)
+
+pool_options = {
+    "pool_size": DB_POOL_SIZE,
+    "max_overflow": DB_MAX_OVERFLOW,
+    "pool_timeout": DB_POOL_TIMEOUT,
+    "pool_recycle": DB_POOL_RECYCLE,
+    "pool_pre_ping": DB_POOL_PRE_PING
+}
+
+async_drivers = {"sqlite": "sqlite+aiosqlite", "postgresql": "postgresql+asyncpg"}
+
+
+def get_async_url(url: str):
+    scheme, _, rest = url.partition("://")
+    return f"{async_drivers.get(scheme, scheme)}://{rest}"
+
+
+def create_db_engine(url: str, stats: PoolStats):
+    connect_args = {"check_same_thread": False} if url.startswith("sqlite") else {}
+    db_engine = create_engine(url, connect_args=connect_args, poolclass=TimedQueuePool, **pool_options)
+    stats.attach(db_engine)
+    instrument_engine(db_engine)
+    return db_engine
 
-db_url = os.environ.get('DATABASE_URL')
-if db_url: # pragma: no cover
-    if db_url.startswith("postgres://"):
-        db_url = db_url.replace("postgres://", "postgresql://", 1)
-    engine = create_engine(db_url)
-else:
-    engine = create_engine(
-        "sqlite:///./test.db",
-        connect_args={"check_same_thread": False}
-    )
+
+def create_async_db_engine(url: str, stats: PoolStats):
+    db_engine = create_async_engine(get_async_url(url), poolclass=TimedAsyncQueuePool, **pool_options)
+    stats.attach(db_engine.sync_engine)
+    instrument_engine(db_engine.sync_engine)
+    return db_engine
+
+
+def normalize_url(url: str):
+    url = url.strip()
+    if url.startswith("postgres://"): # pragma: no cover
+        url = url.replace("postgres://", "postgresql://", 1)
+    return url
+
+
+db_url = normalize_url(os.environ.get('DATABASE_URL') or "sqlite:///./test.db")
+
+pool_stats = {"primary": PoolStats()}
+engine = create_db_engine(db_url, pool_stats["primary"])
+async_engine = None
+if DATABASE_ASYNC:
+    pool_stats["primary_async"] = PoolStats()
+    async_engine = create_async_db_engine(db_url, pool_stats["primary_async"])
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+AsyncSessionLocal = sessionmaker(
+    autocommit=False, autoflush=False, expire_on_commit=False, bind=async_engine, class_=AsyncSession
+)
 Base = declarative_base()
 
 
+def create_replica(name: str, url: str):
+    pool_stats[name] = PoolStats()
+    replica_engine = create_db_engine(url, pool_stats[name])
+    async_session_factory = None
+    if DATABASE_ASYNC:
+        pool_stats[f"{name}_async"] = PoolStats()
+        async_session_factory = sessionmaker(
+            autocommit=False,
+            autoflush=False,
+            expire_on_commit=False,
+            bind=create_async_db_engine(url, pool_stats[f"{name}_async"]),
+            class_=AsyncSession,
+            info={"replica": name}
+        )
+    return Replica(
+        name,
+        replica_engine,
+        sessionmaker(autocommit=False, autoflush=False, bind=replica_engine, info={"replica": name}),
+        async_session_factory
+    )
+
+
+replicas = ReplicaSet(
+    [create_replica(f"replica_{i}", normalize_url(url)) for i, url in enumerate(DATABASE_REPLICA_URLS)],
+    max_lag=DB_REPLICA_MAX_LAG,
+    check_interval=DB_REPLICA_CHECK_INTERVAL,
+    sticky_seconds=DB_REPLICA_STICKY_SECONDS
+)
+
+
 # Dependency
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+# Dependency for reads that must see the primary, such as auth, switched by DATABASE_ASYNC
+def get_primary_read_db():
+    yield from get_db()
+
+
+if DATABASE_ASYNC:
+    get_primary_read_db = get_async_db
+
+
+def choose_replica(request: Request) -> Optional[Replica]:
+    """The replica to serve a read from, or None for the primary."""
+    if not replicas or wrote_recently(request.cookies):
+        return None
+    return replicas.choose()
+
+
+# Dependency for the read endpoints: a replica session when one is healthy
+def get_read_db(request: Request):
+    replica = choose_replica(request)
+    if replica is None:
+        yield from get_db()
+        return
+    with replica.session_factory() as db:
+        yield db
+
+
+async def get_async_read_db(request: Request):
+    replica = choose_replica(request)
+    session_factory = AsyncSessionLocal if replica is None else replica.async_session_factory
+    async with session_factory() as db:
+        yield db
+
+
+if DATABASE_ASYNC:
+    get_read_db = get_async_read_db
+
+
+def is_replica(db) -> bool:
+    return "replica" in db.info
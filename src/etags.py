@@ -0,0 +1,27 @@
+import hashlib
+
+from typing import Iterable, Optional, Sequence
+
+
+# Columns that change whenever a house's representation changes; `version` is
+# bumped by crud.update_house and crud.create_house_member.
+HOUSE_ETAG_FIELDS = ("id", "version", "name", "words", "description")
+# Enough for a projection of the houses, whose `variant` names what it holds
+HOUSE_VERSION_FIELDS = ("id", "version")
+
+
+def compute_etag(houses: Iterable, fields: Sequence[str] = HOUSE_ETAG_FIELDS, variant: str = ""):
+    """Strong ETag for one house or a page of houses, from ORM objects or version rows."""
+    digest = hashlib.sha1(variant.encode())
+    for house in houses:
+        digest.update(repr(tuple(getattr(house, field) for field in fields)).encode())
+    return f'"{digest.hexdigest()}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str):
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    tags = (tag.strip() for tag in if_none_match.split(","))
+    return etag in (tag[2:] if tag.startswith("W/") else tag for tag in tags)
@@ -0,0 +1,62 @@
+import asyncio
+import os
+
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Optional
+
+from starlette.concurrency import run_in_threadpool
+
+
+PASSWORD_HASH_EXECUTOR = os.environ.get('PASSWORD_HASH_EXECUTOR') or 'thread'
+PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS') or 2)
+PASSWORD_HASH_QUEUE_TIMEOUT = float(os.environ.get('PASSWORD_HASH_QUEUE_TIMEOUT') or 5)
+
+
+class HashingPoolBusy(Exception):
+    pass
+
+
+class HashingPool:
+    """Runs password hashing on its own bounded executor instead of the request threadpool.
+
+    At most `workers` calls run at once. A call still waiting for a worker after
+    `queue_timeout` seconds is cancelled and raises `HashingPoolBusy`. With
+    `workers=0` calls go to the shared request threadpool, as plain sync handlers do.
+    """
+
+    def __init__(self, workers: int = 2, queue_timeout: float = 5, processes: bool = False):
+        self.workers = workers
+        self.queue_timeout = queue_timeout
+        self.processes = processes
+        self._executor: Optional[Executor] = None
+
+    @property
+    def executor(self):
+        if self._executor is None:
+            executor_class = ProcessPoolExecutor if self.processes else ThreadPoolExecutor
+            self._executor = executor_class(max_workers=self.workers)
+        return self._executor
+
+    async def run(self, fn: Callable, *args):
+        if self.workers <= 0:
+            return await run_in_threadpool(fn, *args)
+        future = self.executor.submit(fn, *args)
+        waiter = asyncio.wrap_future(future)
+        try:
+            return await asyncio.wait_for(asyncio.shield(waiter), self.queue_timeout)
+        except asyncio.TimeoutError:
+            if future.cancel():
+                raise HashingPoolBusy()
+            return await waiter
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+
+pool = HashingPool(
+    workers=PASSWORD_HASH_WORKERS,
+    queue_timeout=PASSWORD_HASH_QUEUE_TIMEOUT,
+    processes=PASSWORD_HASH_EXECUTOR == 'process'
+)
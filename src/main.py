@@ -1,25 +1,41 @@
+import json
 import os
+import time
 
 from datetime import datetime, timedelta
-from typing import List, Optional
+from typing import List, Optional, Tuple, Union
 
-from fastapi import Depends, FastAPI, HTTPException, Security, status
+from fastapi import Depends, FastAPI, Header, HTTPException, Request, Response, Security, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, ORJSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.security import (
     OAuth2PasswordBearer,
     OAuth2PasswordRequestForm,
     SecurityScopes
 )
-from jose import JWTError, jwt
 from pydantic import ValidationError
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 
-from . import crud, models, schemas
-from .database import engine, get_db
+from . import (
+    admission, batching, cache, compression, crud, database, etags, hashing, metrics, migrations, models, pagination,
+    records, replicas, schemas, search, serializers
+)
+from .database import engine, get_db, get_primary_read_db, get_read_db, is_replica, pool_stats
 
 
 SECRET_KEY = os.environ.get('SECRET_KEY') or 'secret'
 ALGORITHM = os.environ.get('ALGORITHM') or 'HS256'
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.environ.get('ACCESS_TOKEN_EXPIRE_MINUTES') or 15)
+HOUSES_MEMBERS_LOADING = os.environ.get('HOUSES_MEMBERS_LOADING') or 'selectin'
+HOUSE_MEMBERS_LOADING = os.environ.get('HOUSE_MEMBERS_LOADING') or 'joined'
+# Encode responses with orjson, and house reads straight from the rows
+FAST_JSON = (os.environ.get('FAST_JSON') or '').lower() in ('1', 'true', 'yes')
+# Embed members in house responses that do not ask for specific fields
+HOUSE_INCLUDE_MEMBERS = (os.environ.get('HOUSE_INCLUDE_MEMBERS') or 'true').lower() in ('1', 'true', 'yes')
+# Run `python -m src.migrations` from each worker's startup instead of as a release step
+DB_MIGRATE_ON_STARTUP = (os.environ.get('DB_MIGRATE_ON_STARTUP') or '').lower() in ('1', 'true', 'yes')
 
 
 oauth2_scheme = OAuth2PasswordBearer(
@@ -32,9 +48,29 @@ oauth2_scheme = OAuth2PasswordBearer(
     }
 )
 
-models.Base.metadata.create_all(bind=engine)
+app = FastAPI(default_response_class=ORJSONResponse if FAST_JSON else JSONResponse)
+app.add_middleware(compression.CompressionMiddleware)
+app.add_middleware(
+    admission.AdmissionMiddleware,
+    get_controller=lambda: admission.controller,
+    retry_after=admission.ADMISSION_RETRY_AFTER
+)
+app.add_middleware(replicas.ReadYourWritesMiddleware, get_replicas=lambda: database.replicas)
+app.add_middleware(metrics.MetricsMiddleware)
+
+
+@app.on_event("startup")
+def prepare_database():
+    """Migrate if asked to, and open the first pool connection before serving requests."""
+    if DB_MIGRATE_ON_STARTUP:
+        migrations.upgrade(engine)
+    with engine.connect():
+        pass
 
-app = FastAPI()
+
+@app.on_event("shutdown")
+def shutdown_hashing_pool():
+    hashing.pool.shutdown()
 
 
 def get_user(db: Session, email: str):
@@ -42,16 +78,62 @@ def get_user(db: Session, email: str):
     return user
 
 
-def authenticate_user(db: Session, email: str, password: str):
-    user = get_user(db, email)
-    if user is None:
+async def run_read(db: Union[Session, AsyncSession], read, async_read, **params):
+    """Run the async variant of a crud read on an AsyncSession, else the sync one in the threadpool."""
+    if isinstance(db, AsyncSession):
+        return await async_read(db, **params)
+    return await run_in_threadpool(read, db, **params)
+
+
+def cached_entry(request: Request, key):
+    """The cached response for `key`, skipped for a client in its read-your-writes window.
+
+    Another client's replica read may have cached a body older than this client's write.
+    """
+    if replicas.wrote_recently(request.cookies):
+        return None
+    return cache.houses.get(key)
+
+
+def cache_entry(request: Request, key, entry: cache.HouseEntry, generation: int, db: Union[Session, AsyncSession]):
+    if not replicas.wrote_recently(request.cookies):
+        cache.houses.set(key, entry, generation, ttl=cache_ttl(db))
+
+
+def cache_ttl(db: Union[Session, AsyncSession]):
+    """Keep responses read from a replica no longer than the lag it is allowed."""
+    return database.replicas.max_lag if is_replica(db) else None
+
+
+async def hash_password_call(fn, *args):
+    try:
+        return await hashing.pool.run(fn, *args)
+    except hashing.HashingPoolBusy:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many password operations, try again later",
+            headers={"Retry-After": "1"}
+        )
+
+
+async def authenticate_user(db: Session, email: str, password: str):
+    db_user = await run_in_threadpool(get_user, db, email)
+    if db_user is None:
         return False
-    if not crud.verify_password(password, user.hashed_password):
+    user = schemas.User.from_orm(db_user)
+    verified, new_hash = await hash_password_call(
+        crud.verify_and_update_password, password, db_user.hashed_password
+    )
+    if not verified:
         return False
+    if new_hash:
+        await run_in_threadpool(crud.update_password_hash, db, user.id, new_hash)
     return user
  
 
 def create_access_token(data: dict):
+    from jose import jwt
+
     to_encode = data.copy()
     expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     to_encode.update({"exp": expire})
@@ -59,10 +141,30 @@ def create_access_token(data: dict):
     return encoded_jwt
 
 
+def decode_token(token: str) -> Optional[cache.TokenClaims]:
+    """The claims of a valid token, cached until it expires, or None."""
+    claims = cache.tokens.get(token)
+    if claims is not None:
+        return claims
+    from jose import JWTError, jwt
+
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        return None
+    username, scopes = payload.get("sub"), payload.get("scopes", "")
+    if not isinstance(username, str) or not isinstance(scopes, str):
+        return None
+    claims = cache.TokenClaims(username=username, scopes=frozenset(scopes.split(sep=' ')))
+    expires = payload.get("exp")
+    cache.tokens.set(token, claims, ttl=expires - time.time() if expires is not None else None)
+    return claims
+
+
 async def get_current_user(
     security_scopes: SecurityScopes,
     token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db)
+    db: Union[Session, AsyncSession] = Depends(get_primary_read_db)
 ):
     authenticate_value = f'Bearer scope="{security_scopes.scope_str}"' if security_scopes.scopes else "Bearer"
     credentials_exception = HTTPException(
@@ -70,40 +172,205 @@ async def get_current_user(
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": authenticate_value},
     )
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            raise credentials_exception
-        token_scopes = payload.get("scopes", []).split(sep=' ')
-        token_data = schemas.TokenData(username=username, scopes=token_scopes)
-    except JWTError:
-        raise credentials_exception
-    except ValidationError:
+    token_data = decode_token(token)
+    if token_data is None:
         raise credentials_exception
-    for scope in security_scopes.scopes:
-        if scope not in token_data.scopes:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Not enough permissions",
-                headers={"WWW-Authenticate": authenticate_value}
-            )
-    user = get_user(db, email=token_data.username)
+    if not token_data.scopes.issuperset(security_scopes.scopes):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Not enough permissions",
+            headers={"WWW-Authenticate": authenticate_value}
+        )
+    user = cache.principals.get(token_data.username)
     if user is None:
-        raise credentials_exception
+        db_user = await run_read(db, get_user, crud.async_read_user_by_email, email=token_data.username)
+        if db_user is None:
+            raise credentials_exception
+        user = schemas.User.from_orm(db_user)
+        cache.principals.set(token_data.username, user)
     if user.is_active:
         return user
     raise HTTPException(status_code=400, detail="Inactive user")
 
 
+def render_json(content):
+    if FAST_JSON:
+        return serializers.dumps(content)
+    return JSONResponse(jsonable_encoder(content)).body
+
+
+def render_house(house: Union[models.House, records.HouseRecord], fields: Optional[Tuple[str, ...]] = None):
+    """What `render_json` needs to encode `house` as a `schemas.House`, or just its `fields`."""
+    if fields is not None:
+        return serializers.house_to_dict(house, fields)
+    if FAST_JSON:
+        return serializers.house_to_dict(house)
+    return schemas.House.from_orm(house)
+
+
+def split_list(value: str):
+    return {item.strip() for item in value.split(",")} - {""}
+
+
+def house_fields(fields: Optional[str] = None, include: Optional[str] = None):
+    """The house fields a request asks for, in `schemas.House` order, or None for all of them.
+
+    `fields` lists the columns to return and `include=members` embeds the
+    members, which are otherwise left out when `fields` is given, or when
+    HOUSE_INCLUDE_MEMBERS is off.
+    """
+    if fields is None and include is None and HOUSE_INCLUDE_MEMBERS:
+        return None
+    requested = set(serializers.HOUSE_COLUMNS) if fields is None else split_list(fields)
+    included = split_list(include or "")
+    unknown = (requested - set(serializers.HOUSE_FIELDS)) | (included - {"members"})
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+    requested |= included
+    projection = tuple(field for field in serializers.HOUSE_FIELDS if field in requested)
+    return None if projection == serializers.HOUSE_FIELDS else projection
+
+
+def read_options(fields: Optional[Tuple[str, ...]], members: str):
+    """crud read arguments that select only the columns, and members, in `fields`."""
+    if fields is None:
+        return {"members": members}
+    return {
+        "members": members if "members" in fields else None,
+        "columns": [field for field in fields if field in crud.house_columns]
+    }
+
+
+def house_etag(houses, fields: Optional[Tuple[str, ...]]):
+    if fields is None:
+        return etags.compute_etag(houses)
+    return etags.compute_etag(houses, etags.HOUSE_VERSION_FIELDS, variant=",".join(fields))
+
+
+def cached_response(entry: cache.HouseEntry, if_none_match: Optional[str]):
+    if etags.etag_matches(if_none_match, entry.etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": entry.etag})
+    return Response(content=entry.body, media_type="application/json", headers={"ETag": entry.etag})
+
+
+async def read_import_rows(request: Request):
+    body = await request.body()
+    try:
+        if request.headers.get("content-type", "").startswith("application/x-ndjson"):
+            return [json.loads(line) for line in body.splitlines() if line.strip()]
+        rows = json.loads(body)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid JSON body")
+    if not isinstance(rows, list):
+        raise HTTPException(status_code=400, detail="Expected a JSON array of houses")
+    return rows
+
+
 @app.get("/")
 def read_root():
     return "Valar Morghulis"
 
+
+@app.get("/stats/cache")
+def read_cache_stats():
+    return cache.stats()
+
+
+@app.get("/stats/pool")
+def read_pool_stats():
+    return {name: stats.snapshot() for name, stats in pool_stats.items()}
+
+
+@app.get("/stats/replicas")
+def read_replica_stats():
+    return database.replicas.stats()
+
+
+@app.get("/stats/admission")
+def read_admission_stats():
+    return dict(
+        admission.controller.stats(),
+        shed={"/".join(labels): counter.value for labels, counter in metrics.admission_shed.children.items()}
+    )
+
+
+def collect_pool_metrics():
+    lines = []
+    for metric, help, kind, field in (
+        ("db_pool_checked_out", "Connections checked out of the pool.", "gauge", "checked_out"),
+        ("db_pool_connections_created_total", "Connections opened by the pool.", "counter", "created"),
+        ("db_pool_connections_discarded_total", "Connections closed by the pool.", "counter", "discarded"),
+    ):
+        lines += [f"# HELP {metric} {help}", f"# TYPE {metric} {kind}"]
+        for name, stats in pool_stats.items():
+            lines.append(f'{metric}{{engine="{name}"}} {getattr(stats, field)}')
+    lines += [
+        "# HELP db_pool_wait_seconds Time waited to check out a connection.",
+        "# TYPE db_pool_wait_seconds histogram"
+    ]
+    for name, stats in pool_stats.items():
+        lines += metrics.render_histogram("db_pool_wait_seconds", {"engine": name}, stats.wait.snapshot())
+    return lines
+
+
+def collect_cache_metrics():
+    lines = []
+    for name, help, kind, field in (
+        ("cache_hits_total", "Cache lookups that found an entry.", "counter", "hits"),
+        ("cache_misses_total", "Cache lookups that found no entry.", "counter", "misses"),
+        ("cache_size", "Entries held by the cache.", "gauge", "size"),
+    ):
+        lines += [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+        for cache_name, stats in cache.stats().items():
+            lines.append(f'{name}{{cache="{cache_name}"}} {stats[field]}')
+    return lines
+
+
+def collect_replica_metrics():
+    lines = [
+        "# HELP db_replica_healthy Whether the replica passed its last health check.",
+        "# TYPE db_replica_healthy gauge"
+    ]
+    stats = database.replicas.stats()
+    for name, replica in stats.items():
+        lines.append(f'db_replica_healthy{{replica="{name}"}} {int(replica["healthy"])}')
+    lines += [
+        "# HELP db_replica_lag_seconds Replication lag measured by the last health check.",
+        "# TYPE db_replica_lag_seconds gauge"
+    ]
+    for name, replica in stats.items():
+        if replica["lag_seconds"] is not None:
+            lines.append(f'db_replica_lag_seconds{{replica="{name}"}} {replica["lag_seconds"]}')
+    return lines
+
+
+def collect_admission_metrics():
+    stats = admission.controller.stats()
+    lines = [
+        "# HELP admission_in_flight Requests holding an admission slot.",
+        "# TYPE admission_in_flight gauge",
+        f"admission_in_flight {stats['in_flight']}",
+        "# HELP admission_queue_depth Requests waiting for an admission slot, by route class.",
+        "# TYPE admission_queue_depth gauge"
+    ]
+    for name in admission.ADMISSION_PRIORITIES:
+        lines.append(f'admission_queue_depth{{class="{name}"}} {stats["queued"].get(name, 0)}')
+    return lines
+
+
+metrics.registry.collectors += [
+    collect_pool_metrics, collect_cache_metrics, collect_replica_metrics, collect_admission_metrics
+]
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def read_metrics():
+    return PlainTextResponse(metrics.registry.render(), media_type="text/plain; version=0.0.4")
+
 # TODO: Change the way scopes are being added to the token
 @app.post("/login", response_model=schemas.Token)
-def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    user = authenticate_user(db, form_data.username, form_data.password)
+async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+    user = await authenticate_user(db, form_data.username, form_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -117,14 +384,33 @@ def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depend
 
 
 @app.post("/users/", response_model=schemas.User, status_code=201)
-def create_user(
+async def create_user(
     user: schemas.UserCreate,
     db: Session = Depends(get_db),
     current_user: schemas.User = Security(get_current_user, scopes=["users:write"])
 ):
-    if crud.read_user_by_email(db, email=user.email):
+    hashed_password = await hash_password_call(crud.get_password_hash, user.password)
+    try:
+        db_user = await run_in_threadpool(crud.create_user, db=db, user=user, hashed_password=hashed_password)
+    except crud.AlreadyExists:
         raise HTTPException(status_code=400, detail="Email already registered")
-    return crud.create_user(db=db, user=user)
+    return schemas.User.from_orm(db_user)
+
+
+@app.get("/users/", response_model=List[schemas.User])
+def read_users(
+    request: Request,
+    response: Response,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_db),
+    current_user: schemas.User = Security(get_current_user, scopes=["users:read"])
+):
+    after_id = pagination.decode_cursor(cursor) if cursor else None
+    users = crud.read_user_rows(db, skip=skip, limit=limit, after_id=after_id)
+    pagination.set_next_link(request, response, users, limit)
+    return users
 
 
 @app.delete("/users/{user_id}", status_code=204)
@@ -143,24 +429,115 @@ def create_house(
     db: Session = Depends(get_db),
     current_user: schemas.User = Security(get_current_user, scopes=["houses:write"])
 ):
-    db_house = crud.read_house_by_name(db, name=house.name)
-    if db_house:
+    try:
+        return crud.create_house(db=db, house=house)
+    except crud.AlreadyExists:
         raise HTTPException(status_code=400, detail="House already registered")
-    return crud.create_house(db=db, house=house)
+
+
+@app.post("/houses/import", response_model=schemas.HouseImportResult)
+def import_houses(
+    rows: list = Depends(read_import_rows),
+    db: Session = Depends(get_db),
+    current_user: schemas.User = Security(get_current_user, scopes=["houses:write"])
+):
+    houses, indexes, errors = [], [], []
+    for index, row in enumerate(rows):
+        try:
+            houses.append(schemas.HouseImport.parse_obj(row))
+            indexes.append(index)
+        except ValidationError as e:
+            errors.append(schemas.HouseImportError(index=index, detail=str(e)))
+    result = crud.import_houses(db, houses)
+    for error in result.errors:
+        error.index = indexes[error.index]
+    result.errors = sorted(errors + result.errors, key=lambda error: error.index)
+    return result
 
 
 @app.get("/houses/", response_model=List[schemas.House])
-def read_houses(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    houses = crud.read_houses(db, skip=skip, limit=limit)
-    return houses
+async def read_houses(
+    request: Request,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    if_none_match: Optional[str] = Header(None),
+    fields: Optional[Tuple[str, ...]] = Depends(house_fields),
+    db: Union[Session, AsyncSession] = Depends(get_read_db)
+):
+    after_id = pagination.decode_cursor(cursor) if cursor else None
+    page = dict(skip=skip, limit=limit, after_id=after_id)
+    key = ("page", skip if after_id is None else None, limit, after_id, fields)
+    entry = cached_entry(request, key)
+    if entry is None and if_none_match:
+        versions = await run_read(db, crud.read_houses_versions, crud.async_read_houses_versions, **page)
+        etag = house_etag(versions, fields)
+        if etags.etag_matches(if_none_match, etag):
+            not_modified = Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+            pagination.set_next_link(request, not_modified, versions, limit)
+            return not_modified
+    if entry is None:
+        generation = cache.houses.generation
+        houses = await run_read(
+            db,
+            crud.read_house_records,
+            crud.async_read_house_records,
+            **read_options(fields, HOUSES_MEMBERS_LOADING),
+            **page
+        )
+        entry = cache.HouseEntry(
+            body=render_json([render_house(house, fields) for house in houses]),
+            etag=house_etag(houses, fields),
+            ids=tuple(house.id for house in houses),
+            page=(after_id, limit)
+        )
+        cache_entry(request, key, entry, generation, db)
+    response = cached_response(entry, if_none_match)
+    pagination.set_next_link_after(request, response, entry.ids, limit)
+    return response
+
+
+@app.get("/houses/export")
+def export_houses(db: Session = Depends(get_db)):
+    lines = (render_json(house) + b"\n" for house in crud.stream_houses(db))
+    return StreamingResponse(lines, media_type="application/x-ndjson")
 
 
 @app.get("/houses/{house_name}", response_model=schemas.House)
-def read_house(house_name: str, db: Session = Depends(get_db)):
-    db_house = crud.read_house_by_name(db, name=house_name)
-    if db_house is None:
-        raise HTTPException(status_code=404, detail="House not found")
-    return db_house
+async def read_house(
+    request: Request,
+    house_name: str,
+    if_none_match: Optional[str] = Header(None),
+    fields: Optional[Tuple[str, ...]] = Depends(house_fields),
+    db: Union[Session, AsyncSession] = Depends(get_read_db)
+):
+    key = ("house", house_name, fields)
+    entry = cached_entry(request, key)
+    if entry is None and if_none_match:
+        version = await run_read(db, crud.read_house_version, crud.async_read_house_version, name=house_name)
+        if version is None:
+            raise HTTPException(status_code=404, detail="House not found")
+        etag = house_etag([version], fields)
+        if etags.etag_matches(if_none_match, etag):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+    if entry is None:
+        generation = cache.houses.generation
+        db_house = await run_read(
+            db,
+            crud.read_house_record_by_name,
+            crud.async_read_house_record_by_name,
+            name=house_name,
+            **read_options(fields, HOUSE_MEMBERS_LOADING)
+        )
+        if db_house is None:
+            raise HTTPException(status_code=404, detail="House not found")
+        entry = cache.HouseEntry(
+            body=render_json(render_house(db_house, fields)),
+            etag=house_etag([db_house], fields),
+            ids=(db_house.id,)
+        )
+        cache_entry(request, key, entry, generation, db)
+    return cached_response(entry, if_none_match)
 
 
 @app.put("/houses/{house_name}", response_model=schemas.House)
@@ -170,10 +547,13 @@ def update_house(
     db: Session = Depends(get_db),
     current_user: schemas.User = Security(get_current_user, scopes=["houses:write"])
 ):
-    db_house = crud.read_house_by_name(db, name=house_name)
-    if db_house:
-        return crud.update_house(db=db, house_id=db_house.id, house=house)
-    raise HTTPException(status_code=404, detail="House not found")    
+    try:
+        db_house = crud.update_house_by_name(db=db, name=house_name, house=house)
+    except crud.AlreadyExists:
+        raise HTTPException(status_code=400, detail="House already registered")
+    if db_house is None:
+        raise HTTPException(status_code=404, detail="House not found")
+    return db_house
 
 
 @app.delete("/houses/{house_id}", status_code=204)
@@ -187,10 +567,54 @@ def delete_house(
 
 
 @app.post("/houses/{house_id}/members/", response_model=schemas.Character, status_code=201)
-def create_member_for_house(
+async def create_member_for_house(
     house_id: int,
     character: schemas.CharacterBase,
     db: Session = Depends(get_db),
     current_user: schemas.User = Security(get_current_user, scopes=["houses:write"])
 ):
-    return crud.create_house_member(db=db, character=character, house_id=house_id)
+    if batching.members is not None:
+        db_character = await batching.members.add(house_id, character)
+    else:
+        db_character = await run_in_threadpool(crud.create_house_member, db=db, character=character, house_id=house_id)
+    if db_character is None:
+        raise HTTPException(status_code=404, detail="House not found")
+    return db_character
+
+
+@app.get("/houses/{house_id}/members/", response_model=List[schemas.Character])
+async def read_house_members(
+    request: Request,
+    response: Response,
+    house_id: int,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    name: Optional[str] = None,
+    db: Union[Session, AsyncSession] = Depends(get_read_db)
+):
+    after_id = pagination.decode_cursor(cursor) if cursor else None
+    members = await run_read(
+        db,
+        crud.read_house_members,
+        crud.async_read_house_members,
+        house_id=house_id,
+        skip=skip,
+        limit=limit,
+        after_id=after_id,
+        name=name
+    )
+    if not members and not await run_read(db, crud.house_exists, crud.async_house_exists, house_id=house_id):
+        raise HTTPException(status_code=404, detail="House not found")
+    pagination.set_next_link(request, response, members, limit)
+    return members
+
+
+@app.get("/search", response_model=List[schemas.SearchResult])
+async def search_houses_and_characters(
+    q: str, skip: int = 0, limit: int = 20, db: Union[Session, AsyncSession] = Depends(get_read_db)
+):
+    try:
+        return await run_read(db, search.search, search.async_search, q=q, skip=skip, limit=limit)
+    except search.SearchNotSupported:
+        raise HTTPException(status_code=501, detail="Search is not supported on this database")
@@ -0,0 +1,317 @@
+import bisect
+import threading
+import time
+
+from contextvars import ContextVar
+from functools import wraps
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from starlette.routing import Match
+
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+class Histogram:
+    """Cumulative histogram of observed values, as Prometheus buckets them."""
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        with self._lock:
+            index = bisect.bisect_left(self.buckets, value)
+            if index < len(self.counts):
+                self.counts[index] += 1
+            self.count += 1
+            self.sum += value
+
+    def snapshot(self):
+        with self._lock:
+            cumulative, buckets = 0, {}
+            for bound, count in zip(self.buckets, self.counts):
+                cumulative += count
+                buckets[str(bound)] = cumulative
+            buckets["+Inf"] = self.count
+            return {"buckets": buckets, "count": self.count, "sum": self.sum}
+
+
+class PoolStats:
+    """Connection pool statistics collected from an engine's pool events."""
+
+    def __init__(self):
+        self.checked_out = 0
+        self.created = 0
+        self.discarded = 0
+        self.wait = Histogram()
+        self._lock = threading.Lock()
+
+    def attach(self, engine):
+        engine.pool.stats = self
+        event.listen(engine, "connect", self._on_connect)
+        event.listen(engine, "checkout", self._on_checkout)
+        event.listen(engine, "checkin", self._on_checkin)
+        event.listen(engine, "close", self._on_discard)
+        event.listen(engine, "close_detached", self._on_discard)
+        return self
+
+    def _add(self, name: str, value: int):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + value)
+
+    def _on_connect(self, dbapi_connection, connection_record):
+        self._add("created", 1)
+
+    def _on_checkout(self, dbapi_connection, connection_record, connection_proxy):
+        self._add("checked_out", 1)
+
+    def _on_checkin(self, dbapi_connection, connection_record):
+        self._add("checked_out", -1)
+
+    def _on_discard(self, dbapi_connection, *args):
+        self._add("discarded", 1)
+
+    def snapshot(self):
+        return {
+            "checked_out": self.checked_out,
+            "created": self.created,
+            "discarded": self.discarded,
+            "wait_seconds": self.wait.snapshot()
+        }
+
+
+class TimedPoolMixin:
+    """Reports how long each checkout waited for a connection to `stats.wait`."""
+
+    stats = None
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            if self.stats is not None:
+                self.stats.wait.observe(time.perf_counter() - start)
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.stats = self.stats
+        return pool
+
+
+class TimedQueuePool(TimedPoolMixin, QueuePool):
+    pass
+
+
+class TimedAsyncQueuePool(TimedPoolMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+class Value:
+    """A counter or gauge value."""
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount: float = 1):
+        self.inc(-amount)
+
+
+class Family:
+    """A metric with one child per set of label values, rendered in Prometheus text format."""
+
+    def __init__(self, name: str, help: str, kind: str, labelnames: Sequence[str] = (), **options):
+        self.name = name
+        self.help = help
+        self.kind = kind
+        self.labelnames = tuple(labelnames)
+        self.options = options
+        self.children: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values: str):
+        child = self.children.get(values)
+        if child is None:
+            with self._lock:
+                child = self.children.setdefault(
+                    values, Histogram(**self.options) if self.kind == "histogram" else Value()
+                )
+        return child
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for values, child in sorted(self.children.items()):
+            labels = dict(zip(self.labelnames, values))
+            if self.kind == "histogram":
+                lines.extend(render_histogram(self.name, labels, child.snapshot()))
+            else:
+                lines.append(f"{self.name}{format_labels(labels)} {child.value:g}")
+        return lines
+
+
+def escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labels(labels: Dict[str, str]):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{escape(value)}"' for name, value in labels.items()) + "}"
+
+
+def render_histogram(name: str, labels: Dict[str, str], snapshot: dict):
+    lines = [
+        f"{name}_bucket{format_labels(dict(labels, le=bound))} {count}"
+        for bound, count in snapshot["buckets"].items()
+    ]
+    lines.append(f"{name}_sum{format_labels(labels)} {snapshot['sum']:g}")
+    lines.append(f"{name}_count{format_labels(labels)} {snapshot['count']}")
+    return lines
+
+
+class Registry:
+    def __init__(self):
+        self.families: List[Family] = []
+        self.collectors: List[Callable[[], List[str]]] = []
+
+    def family(self, *args, **kwargs):
+        family = Family(*args, **kwargs)
+        self.families.append(family)
+        return family
+
+    def render(self):
+        lines = []
+        for family in self.families:
+            lines.extend(family.render())
+        for collector in self.collectors:
+            lines.extend(collector())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+request_duration = registry.family(
+    "http_request_duration_seconds", "Request latency by route.", "histogram", ("method", "route", "status")
+)
+requests_in_progress = registry.family(
+    "http_requests_in_progress", "Requests being served by route.", "gauge", ("method", "route")
+)
+request_statements = registry.family(
+    "http_request_db_statements", "SQL statements executed per request.", "histogram", ("method", "route"),
+    buckets=COUNT_BUCKETS
+)
+request_db_time = registry.family(
+    "http_request_db_seconds", "Time spent executing SQL per request.", "histogram", ("method", "route")
+)
+# Observed where the hash runs, so calls made in a process pool are not counted.
+password_verify_duration = registry.family(
+    "password_verify_seconds", "Time spent in crud.verify_password.", "histogram"
+)
+admission_wait = registry.family(
+    "admission_wait_seconds", "Time admitted requests waited for a slot, by route class.", "histogram", ("class",)
+)
+admission_shed = registry.family(
+    "admission_shed_total", "Requests answered 503 by admission control.", "counter", ("class", "reason")
+)
+
+
+class QueryStats:
+    def __init__(self):
+        self.statements = 0
+        self.seconds = 0.0
+
+
+# SQL executed on behalf of the current request; context variables follow the
+# request into the threadpool and into SQLAlchemy's asyncio greenlets.
+current_queries: ContextVar[Optional[QueryStats]] = ContextVar("current_queries", default=None)
+
+
+def instrument_engine(engine):
+    """Attribute every statement run on `engine` to the current request.
+
+    The start time lives on the statement's execution context, which is
+    dropped with it, so statements that raise leave nothing behind.
+    """
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        context.query_start = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - context.query_start
+        queries = current_queries.get()
+        if queries is not None:
+            queries.statements += 1
+            queries.seconds += elapsed
+
+    return engine
+
+
+def timed(family: Family):
+    """Observe the duration of every call to the decorated function."""
+
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                family.labels().observe(time.perf_counter() - start)
+        return wrapper
+
+    return decorator
+
+
+def route_path(scope):
+    for route in scope["app"].routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return route.path
+    return "unmatched"
+
+
+class MetricsMiddleware:
+    """Records latency, in-flight requests and SQL work per route template."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        method, route = scope["method"], route_path(scope)
+        in_progress = requests_in_progress.labels(method, route)
+        queries = QueryStats()
+        token = current_queries.set(queries)
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        in_progress.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            request_duration.labels(method, route, str(status)).observe(time.perf_counter() - start)
+            request_statements.labels(method, route).observe(queries.statements)
+            request_db_time.labels(method, route).observe(queries.seconds)
+            in_progress.dec()
+            current_queries.reset(token)
@@ -0,0 +1,206 @@
+"""Versioned schema changes, applied before the app serves traffic.
+
+    python -m src.migrations
+
+Pending migrations run in one transaction and are recorded in the
+`schema_migrations` table, so `upgrade` only applies what a database is
+missing. The transaction holds a lock (BEGIN IMMEDIATE on SQLite, an advisory
+lock on Postgres) while it reads and applies versions, so workers migrating
+from their startup at the same time apply each migration once. Migrations
+check what already exists, which also brings databases created by the app's
+former import-time `create_all` under version control.
+"""
+from itertools import groupby
+from typing import Callable, List, NamedTuple
+
+from sqlalchemy import Boolean, Column, ForeignKey, Integer, MetaData, String, Table, inspect, select, text
+
+from .search import SEARCH_LANGUAGE
+
+
+class Migration(NamedTuple):
+    version: int
+    description: str
+    apply: Callable
+
+
+class MigrationError(Exception):
+    pass
+
+
+schema_migrations = Table(
+    "schema_migrations",
+    MetaData(),
+    Column("version", Integer, primary_key=True),
+    Column("description", String, nullable=False)
+)
+
+
+# The tables as the app first created them; later migrations change them, so
+# this must not follow the models
+initial = MetaData()
+
+Table(
+    "users",
+    initial,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("email", String, unique=True, index=True),
+    Column("hashed_password", String),
+    Column("is_active", Boolean),
+    Column("scopes", String)
+)
+
+Table(
+    "houses",
+    initial,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("name", String, unique=True, index=True),
+    Column("words", String, index=True),
+    Column("description", String, index=True)
+)
+
+Table(
+    "characters",
+    initial,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("name", String, index=True),
+    Column("titles", String, index=True),
+    Column("description", String, index=True),
+    Column("house_id", Integer, ForeignKey("houses.id"))
+)
+
+
+def create_tables(connection):
+    initial.create_all(bind=connection)
+
+
+def add_house_version(connection):
+    if "version" not in {column["name"] for column in inspect(connection).get_columns("houses")}:
+        connection.execute(text("ALTER TABLE houses ADD COLUMN version INTEGER NOT NULL DEFAULT 1"))
+
+
+search_index_ddl = {
+    "sqlite": [
+        "CREATE VIRTUAL TABLE search_index USING fts5("
+        "kind UNINDEXED, ref_id UNINDEXED, name, body, tokenize = 'porter unicode61')"
+    ],
+    "postgresql": [
+        "CREATE TABLE search_index ("
+        "id BIGINT PRIMARY KEY, kind VARCHAR NOT NULL, ref_id INTEGER NOT NULL, "
+        "name VARCHAR, document TSVECTOR NOT NULL)",
+        "CREATE INDEX ix_search_index_document ON search_index USING GIN (document)"
+    ]
+}
+
+search_index_backfill = {
+    "sqlite": [
+        "INSERT INTO search_index (rowid, kind, ref_id, name, body) "
+        "SELECT 2 * id, 'house', id, name, coalesce(words, '') || ' ' || coalesce(description, '') FROM houses",
+        "INSERT INTO search_index (rowid, kind, ref_id, name, body) "
+        "SELECT 2 * id + 1, 'character', id, name, coalesce(titles, '') || ' ' || coalesce(description, '') "
+        "FROM characters"
+    ],
+    "postgresql": [
+        "INSERT INTO search_index (id, kind, ref_id, name, document) "
+        "SELECT 2 * id, 'house', id, name, setweight(to_tsvector(:language, coalesce(name, '')), 'A') || "
+        "to_tsvector(:language, coalesce(words, '') || ' ' || coalesce(description, '')) FROM houses",
+        "INSERT INTO search_index (id, kind, ref_id, name, document) "
+        "SELECT 2 * id + 1, 'character', id, name, setweight(to_tsvector(:language, coalesce(name, '')), 'A') || "
+        "to_tsvector(:language, coalesce(titles, '') || ' ' || coalesce(description, '')) FROM characters"
+    ]
+}
+
+
+def create_search_index(connection):
+    """Create the full-text index and fill it from the tables; other dialects go without search."""
+    dialect = connection.dialect.name
+    if dialect not in search_index_ddl or inspect(connection).has_table("search_index"):
+        return
+    for statement in search_index_ddl[dialect]:
+        connection.execute(text(statement))
+    for statement in search_index_backfill[dialect]:
+        connection.execute(text(statement), {"language": SEARCH_LANGUAGE} if dialect == "postgresql" else {})
+
+
+def index_character_house(connection):
+    connection.execute(text("CREATE INDEX IF NOT EXISTS ix_characters_house_id ON characters (house_id, id)"))
+
+
+def names_differing_in_case(connection):
+    """Groups of house names that only differ in case, which a case-sensitive index allowed."""
+    rows = connection.execute(text(
+        "SELECT name FROM houses WHERE lower(name) IN "
+        "(SELECT lower(name) FROM houses GROUP BY lower(name) HAVING count(*) > 1) ORDER BY lower(name), name"
+    ))
+    return [list(names) for _, names in groupby((name for name, in rows), key=str.lower)]
+
+
+def audit_indexes(connection):
+    """Replace the single-column indexes declared on every column with the ones queries use.
+
+    House names become unique regardless of case, so the migration stops,
+    changing nothing, while names that only differ in case are registered;
+    rename or merge those houses and run it again.
+    """
+    duplicates = names_differing_in_case(connection)
+    if duplicates:
+        raise MigrationError(
+            "House names must be unique regardless of case, rename or merge these houses first: "
+            + "; ".join(", ".join(repr(name) for name in names) for names in duplicates)
+        )
+    connection.execute(text("CREATE INDEX IF NOT EXISTS ix_characters_house_id_name ON characters (house_id, name)"))
+    connection.execute(text("CREATE UNIQUE INDEX IF NOT EXISTS ix_houses_name_lower ON houses (lower(name))"))
+    for name in (
+        "ix_users_id", "ix_houses_id", "ix_houses_name", "ix_houses_words", "ix_houses_description",
+        "ix_characters_id", "ix_characters_name", "ix_characters_titles", "ix_characters_description"
+    ):
+        connection.execute(text(f"DROP INDEX IF EXISTS {name}"))
+
+
+migrations = [
+    Migration(1, "create tables", create_tables),
+    Migration(2, "add houses.version", add_house_version),
+    Migration(3, "create search index", create_search_index),
+    Migration(4, "index characters.house_id", index_character_house),
+    Migration(5, "audit indexes", audit_indexes),
+]
+
+
+def applied_versions(connection):
+    schema_migrations.create(bind=connection, checkfirst=True)
+    return {version for version, in connection.execute(select(schema_migrations.c.version))}
+
+
+# pg_advisory_xact_lock key, any constant shared by every worker
+MIGRATION_LOCK_KEY = 7100250
+
+
+def lock(connection):
+    """Serialize upgrades until the current transaction ends."""
+    dialect = connection.dialect.name
+    if dialect == "sqlite":
+        connection.exec_driver_sql("BEGIN IMMEDIATE")
+    elif dialect == "postgresql":
+        connection.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": MIGRATION_LOCK_KEY})
+
+
+def upgrade(engine) -> List[Migration]:
+    """Apply every migration the database is missing, in order, and return them."""
+    with engine.connect() as connection:
+        with connection.begin():
+            lock(connection)
+            applied = applied_versions(connection)
+            pending = [migration for migration in migrations if migration.version not in applied]
+            for migration in pending:
+                migration.apply(connection)
+                connection.execute(
+                    schema_migrations.insert().values(version=migration.version, description=migration.description)
+                )
+    return pending
+
+
+if __name__ == "__main__":
+    from .database import engine
+
+    for migration in upgrade(engine):
+        print(f"Applied {migration.version}: {migration.description}")
@@ -1,4 +1,4 @@
-from sqlalchemy import Boolean, Column, ForeignKey, Integer, String
+from sqlalchemy import Boolean, Column, ForeignKey, Index, Integer, String, func
 from sqlalchemy.orm import relationship
 
 from .database import Base
@@ -7,7 +7,7 @@ from .database import Base
 class User(Base):
     __tablename__ = "users"
 
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, primary_key=True)
     email = Column(String, unique=True, index=True)
     hashed_password = Column(String)
     is_active = Column(Boolean, default=True)
@@ -17,21 +17,32 @@ class User(Base):
 class House(Base):
     __tablename__ = "houses"
 
-    id = Column(Integer, primary_key=True, index=True)
-    name = Column(String, unique=True, index=True)
-    words = Column(String, index=True)
-    description = Column(String, index=True)
+    id = Column(Integer, primary_key=True)
+    name = Column(String)
+    words = Column(String)
+    description = Column(String)
+    version = Column(Integer, nullable=False, default=1, server_default="1")
 
-    members = relationship("Character", back_populates="house")
+    members = relationship("Character", back_populates="house", order_by="Character.id")
 
 
 class Character(Base):
     __tablename__ = "characters"
 
-    id = Column(Integer, primary_key=True, index=True)
-    name = Column(String, index=True)
-    titles = Column(String, index=True)
-    description = Column(String, index=True)
+    id = Column(Integer, primary_key=True)
+    name = Column(String)
+    titles = Column(String)
+    description = Column(String)
     house_id = Column(Integer, ForeignKey("houses.id"))
 
     house = relationship("House", back_populates="members")
+
+    __table_args__ = (
+        # Members of a house, in id order for cursor pagination
+        Index("ix_characters_house_id", "house_id", "id"),
+        Index("ix_characters_house_id_name", "house_id", "name"),
+    )
+
+
+# House names are unique regardless of case, and looked up the same way
+Index("ix_houses_name_lower", func.lower(House.name), unique=True)
@@ -0,0 +1,32 @@
+import base64
+import binascii
+
+from typing import Sequence
+
+from fastapi import HTTPException, Request, Response
+
+
+def encode_cursor(last_id: int):
+    return base64.urlsafe_b64encode(str(last_id).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str):
+    padded = cursor + "=" * (-len(cursor) % 4)
+    try:
+        return int(base64.urlsafe_b64decode(padded.encode()).decode())
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def set_next_link(request: Request, response: Response, rows: list, limit: int):
+    """Point the Link header at the page after `rows` when there may be one."""
+    set_next_link_after(request, response, [row.id for row in rows], limit)
+
+
+def set_next_link_after(request: Request, response: Response, ids: Sequence[int], limit: int):
+    if not ids or len(ids) < limit:
+        return
+    url = request.url.remove_query_params("skip").include_query_params(
+        cursor=encode_cursor(ids[-1]), limit=limit
+    )
+    response.headers["Link"] = f'<{url}>; rel="next"'
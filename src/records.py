@@ -0,0 +1,33 @@
+"""Read-only records built from Core rows.
+
+They have the attributes the schemas (`orm_mode`), serializers and etags read
+from the models, but none of the identity map or change tracking overhead.
+"""
+from typing import List
+
+
+class Record:
+    __slots__ = ()
+
+    def __init__(self, **values):
+        for name in self.__slots__:
+            setattr(self, name, values.get(name))
+
+    def __eq__(self, other):
+        return type(self) is type(other) and all(
+            getattr(self, name) == getattr(other, name) for name in self.__slots__
+        )
+
+    def __repr__(self):
+        fields = ", ".join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+        return f"{type(self).__name__}({fields})"
+
+
+class CharacterRecord(Record):
+    __slots__ = ("id", "name", "titles", "description", "house_id")
+
+
+class HouseRecord(Record):
+    __slots__ = ("id", "version", "name", "words", "description", "members")
+
+    members: List[CharacterRecord]
@@ -0,0 +1,147 @@
+"""Routing of read-only sessions to database replicas.
+
+Replicas are health-checked in the background at most every `check_interval`
+seconds; one that cannot be reached, or whose replication lag exceeds
+`max_lag` seconds, is skipped until a later check finds it healthy again.
+A client that has just written is sent to the primary for `sticky_seconds`,
+by a cookie the `ReadYourWritesMiddleware` sets on successful writes, so it
+reads its own changes even from a lagging replica set.
+"""
+import itertools
+import threading
+import time
+
+from http.cookies import SimpleCookie
+from typing import Callable, List, Optional
+
+from sqlalchemy import text
+
+
+STICKY_COOKIE = "read_primary_until"
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+# A replica that has replayed everything it received is not behind, however
+# long ago the primary last wrote
+lag_queries = {
+    "postgresql": (
+        "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+        "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+    ),
+}
+
+
+def replication_lag(connection) -> float:
+    """Seconds the replica behind `connection` trails its primary; 0 where the dialect cannot tell."""
+    query = lag_queries.get(connection.dialect.name)
+    if query is None:
+        connection.execute(text("SELECT 1"))
+        return 0.0
+    return float(connection.execute(text(query)).scalar() or 0)
+
+
+class Replica:
+    def __init__(self, name: str, engine, session_factory, async_session_factory=None):
+        self.name = name
+        self.engine = engine
+        self.session_factory = session_factory
+        self.async_session_factory = async_session_factory
+        self.healthy = False
+        self.lag: Optional[float] = None
+        self.checked_at = float("-inf")
+        self.checking = threading.Lock()
+
+
+class ReplicaSet:
+    """Round-robin choice among the replicas that passed their last health check."""
+
+    def __init__(
+        self,
+        replicas: List[Replica],
+        max_lag: float = 5,
+        check_interval: float = 5,
+        sticky_seconds: float = 5,
+        lag: Callable = replication_lag,
+        timer: Callable[[], float] = time.monotonic
+    ):
+        self.replicas = replicas
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.sticky_seconds = sticky_seconds
+        self.lag = lag
+        self.timer = timer
+        self._next = itertools.cycle(replicas)
+
+    def __bool__(self):
+        return bool(self.replicas)
+
+    def check(self, replica: Replica):
+        """Measure `replica`'s lag and mark it healthy or not."""
+        try:
+            with replica.engine.connect() as connection:
+                replica.lag = self.lag(connection)
+            replica.healthy = replica.lag <= self.max_lag
+        except Exception:
+            replica.lag, replica.healthy = None, False
+        finally:
+            replica.checked_at = self.timer()
+
+    def choose(self) -> Optional[Replica]:
+        """The next healthy replica, or None to read from the primary. Never waits for a check."""
+        for _ in range(len(self.replicas)):
+            replica = next(self._next)
+            self._check_if_due(replica)
+            if replica.healthy:
+                return replica
+        return None
+
+    def _check_if_due(self, replica: Replica):
+        if self.timer() - replica.checked_at < self.check_interval or not replica.checking.acquire(blocking=False):
+            return
+
+        def check():
+            try:
+                self.check(replica)
+            finally:
+                replica.checking.release()
+
+        threading.Thread(target=check, name=f"replica-check-{replica.name}", daemon=True).start()
+
+    def stats(self):
+        return {
+            replica.name: {"healthy": replica.healthy, "lag_seconds": replica.lag} for replica in self.replicas
+        }
+
+
+def wrote_recently(cookies: dict) -> bool:
+    """Whether the request's cookies say its client wrote within its sticky window."""
+    try:
+        return float(cookies.get(STICKY_COOKIE) or 0) > time.time()
+    except ValueError:
+        return False
+
+
+class ReadYourWritesMiddleware:
+    """Marks clients of successful writes to read from the primary for a while."""
+
+    def __init__(self, app, get_replicas: Callable[[], ReplicaSet]):
+        self.app = app
+        self.get_replicas = get_replicas
+
+    async def __call__(self, scope, receive, send):
+        replicas = self.get_replicas()
+        if scope["type"] != "http" or scope["method"] in SAFE_METHODS or not replicas or replicas.sticky_seconds <= 0:
+            return await self.app(scope, receive, send)
+
+        async def send_with_cookie(message):
+            if message["type"] == "http.response.start" and message["status"] < 400:
+                cookie = SimpleCookie()
+                cookie[STICKY_COOKIE] = str(int(time.time() + replicas.sticky_seconds) + 1)
+                cookie[STICKY_COOKIE]["max-age"] = str(int(replicas.sticky_seconds) + 1)
+                cookie[STICKY_COOKIE]["path"] = "/"
+                cookie[STICKY_COOKIE]["httponly"] = True
+                cookie[STICKY_COOKIE]["samesite"] = "lax"
+                header = cookie.output(header="").strip().encode("latin-1")
+                message = dict(message, headers=list(message.get("headers", [])) + [(b"set-cookie", header)])
+            await send(message)
+
+        await self.app(scope, receive, send_with_cookie)
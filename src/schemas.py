@@ -48,6 +48,31 @@ class House(HouseBase):
         orm_mode = True
 
 
+class HouseImport(HouseBase):
+    members: List[CharacterBase] = []
+
+
+class HouseImportError(BaseModel):
+    index: int
+    detail: str
+
+
+class HouseImportResult(BaseModel):
+    houses: int = 0
+    members: int = 0
+    errors: List[HouseImportError] = []
+
+
+class SearchResult(BaseModel):
+    kind: str
+    id: int
+    name: Optional[str] = None
+    score: float
+
+    class Config:
+        orm_mode = True
+
+
 class Token(BaseModel):
     access_token: str
     token_type: str
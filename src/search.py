@@ -0,0 +1,179 @@
+"""Full-text index over houses and characters.
+
+Both kinds of document live in one `search_index` table: an FTS5 virtual table
+on SQLite, a tsvector column with a GIN index on Postgres. A document's key is
+derived from its row id (`2 * id` for houses, `2 * id + 1` for characters) so
+it can be replaced or removed by primary key. crud keeps the index in step with
+every write, inside the write's own transaction.
+"""
+import os
+import re
+
+from typing import Iterable
+
+from sqlalchemy import bindparam, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+
+SEARCH_LANGUAGE = os.environ.get('SEARCH_LANGUAGE') or 'english'
+
+ddl = {
+    "sqlite": [
+        "CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5("
+        "kind UNINDEXED, ref_id UNINDEXED, name, body, tokenize = 'porter unicode61')"
+    ],
+    "postgresql": [
+        "CREATE TABLE IF NOT EXISTS search_index ("
+        "id BIGINT PRIMARY KEY, kind VARCHAR NOT NULL, ref_id INTEGER NOT NULL, "
+        "name VARCHAR, document TSVECTOR NOT NULL)",
+        "CREATE INDEX IF NOT EXISTS ix_search_index_document ON search_index USING GIN (document)"
+    ]
+}
+
+key_columns = {"sqlite": "rowid", "postgresql": "id"}
+
+# kind: (table, document key, searchable text besides the name)
+documents = {
+    "house": ("houses", "2 * id", "coalesce(words, '') || ' ' || coalesce(description, '')"),
+    "character": ("characters", "2 * id + 1", "coalesce(titles, '') || ' ' || coalesce(description, '')")
+}
+
+
+class SearchNotSupported(Exception):
+    pass
+
+
+def _dialect_name(db):
+    if isinstance(db, AsyncSession):
+        return db.sync_session.get_bind().dialect.name
+    return (db.dialect if hasattr(db, "dialect") else db.get_bind().dialect).name
+
+
+def _execute(db, statement: str, **params):
+    clause = text(statement)
+    if "ids" in params:
+        clause = clause.bindparams(bindparam("ids", expanding=True))
+    return db.execute(clause, params)
+
+
+def _insert(db, kind: str, where: str = "", **params):
+    table, key, body = documents[kind]
+    if _dialect_name(db) == "postgresql":
+        document = f"setweight(to_tsvector(:language, coalesce(name, '')), 'A') || to_tsvector(:language, {body})"
+        _execute(
+            db,
+            f"INSERT INTO search_index (id, kind, ref_id, name, document) "
+            f"SELECT {key}, '{kind}', id, name, {document} FROM {table} {where}",
+            language=SEARCH_LANGUAGE,
+            **params
+        )
+    else:
+        _execute(
+            db,
+            f"INSERT INTO search_index (rowid, kind, ref_id, name, body) "
+            f"SELECT {key}, '{kind}', id, name, {body} FROM {table} {where}",
+            **params
+        )
+
+
+def _replace(db, kind: str, column: str, ids: Iterable[int], new: bool = False):
+    """Index the rows whose `column` is in `ids`, first removing their documents unless the rows are `new`."""
+    ids = list(ids)
+    dialect = _dialect_name(db)
+    if not ids or dialect not in ddl:
+        return
+    table, key, _ = documents[kind]
+    if not new:
+        _execute(
+            db,
+            f"DELETE FROM search_index WHERE {key_columns[dialect]} IN "
+            f"(SELECT {key} FROM {table} WHERE {column} IN :ids)",
+            ids=ids
+        )
+    _insert(db, kind, f"WHERE {column} IN :ids", ids=ids)
+
+
+def create_index(connection):
+    for statement in ddl[_dialect_name(connection)]:
+        connection.execute(text(statement))
+
+
+def rebuild_index(connection):
+    """Recreate every document from the houses and characters tables."""
+    create_index(connection)
+    connection.execute(text("DELETE FROM search_index"))
+    for kind in documents:
+        _insert(connection, kind)
+
+
+def index_houses(db, house_ids: Iterable[int]):
+    _replace(db, "house", "id", house_ids)
+
+
+def add_house(db, house_id: int):
+    """Index a house inserted in the current transaction."""
+    _replace(db, "house", "id", [house_id], new=True)
+
+
+def add_characters(db, character_ids: Iterable[int]):
+    """Index characters inserted in the current transaction."""
+    _replace(db, "character", "id", character_ids, new=True)
+
+
+def index_members(db, house_ids: Iterable[int]):
+    _replace(db, "character", "house_id", house_ids)
+
+
+def remove_houses(db, house_ids: Iterable[int]):
+    keys = [2 * house_id for house_id in house_ids]
+    dialect = _dialect_name(db)
+    if keys and dialect in ddl:
+        _execute(db, f"DELETE FROM search_index WHERE {key_columns[dialect]} IN :ids", ids=keys)
+
+
+def remove_members_of(db, house_ids: Iterable[int]):
+    """Remove the documents of the houses' characters; run before deleting the characters."""
+    house_ids = list(house_ids)
+    dialect = _dialect_name(db)
+    if house_ids and dialect in ddl:
+        table, key, _ = documents["character"]
+        _execute(
+            db,
+            f"DELETE FROM search_index WHERE {key_columns[dialect]} IN "
+            f"(SELECT {key} FROM {table} WHERE house_id IN :ids)",
+            ids=house_ids
+        )
+
+
+def search_query(db, q: str, skip: int = 0, limit: int = 20):
+    """The statement and parameters of a search for `q`, or None if it has no words."""
+    dialect = _dialect_name(db)
+    if dialect not in ddl:
+        raise SearchNotSupported(dialect)
+    terms = re.findall(r"\w+", q)
+    if not terms:
+        return None
+    if dialect == "postgresql":
+        query = " & ".join(f"{term}:*" if i == len(terms) - 1 else term for i, term in enumerate(terms))
+        return text(
+            "SELECT kind, ref_id AS id, name, ts_rank(document, query) AS score "
+            "FROM search_index, to_tsquery(:language, :query) query "
+            "WHERE document @@ query ORDER BY score DESC, search_index.id LIMIT :limit OFFSET :skip"
+        ), dict(language=SEARCH_LANGUAGE, query=query, skip=skip, limit=limit)
+    query = " ".join(f'"{term}"' for term in terms) + "*"
+    return text(
+        "SELECT kind, ref_id AS id, name, -bm25(search_index, 0, 0, 10.0, 1.0) AS score "
+        "FROM search_index WHERE search_index MATCH :query "
+        "ORDER BY score DESC, rowid LIMIT :limit OFFSET :skip"
+    ), dict(query=query, skip=skip, limit=limit)
+
+
+def search(db, q: str, skip: int = 0, limit: int = 20):
+    """Rank houses and characters matching every word of `q`, the last one as a prefix."""
+    query = search_query(db, q, skip=skip, limit=limit)
+    return db.execute(*query).all() if query else []
+
+
+async def async_search(db: AsyncSession, q: str, skip: int = 0, limit: int = 20):
+    query = search_query(db, q, skip=skip, limit=limit)
+    return (await db.execute(*query)).all() if query else []
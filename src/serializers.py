@@ -0,0 +1,51 @@
+"""Direct encoding of houses and characters for the fast JSON path (FAST_JSON).
+
+The dicts carry the same fields, in the same order, as `schemas.House` and
+`schemas.Character`, so a response renders to the same JSON without building
+and validating pydantic models first.
+"""
+from typing import Sequence, Union
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - only needed with FAST_JSON
+    orjson = None
+
+from . import models, records
+
+
+# `schemas.House` fields, in order
+HOUSE_COLUMNS = ("name", "words", "description", "id")
+HOUSE_FIELDS = HOUSE_COLUMNS + ("members",)
+
+
+def character_to_dict(character: Union[models.Character, records.CharacterRecord]):
+    return {
+        "name": character.name,
+        "titles": character.titles,
+        "description": character.description,
+        "id": character.id,
+        "house_id": character.house_id
+    }
+
+
+def house_to_dict(house: Union[models.House, records.HouseRecord], fields: Sequence[str] = HOUSE_FIELDS):
+    """`house` as a `schemas.House` dict, or one of just the `fields` given."""
+    if fields is not HOUSE_FIELDS:
+        content = {field: getattr(house, field) for field in fields if field != "members"}
+        if "members" in fields:
+            content["members"] = [character_to_dict(member) for member in house.members]
+        return content
+    return {
+        "name": house.name,
+        "words": house.words,
+        "description": house.description,
+        "id": house.id,
+        "members": [character_to_dict(member) for member in house.members]
+    }
+
+
+def dumps(content) -> bytes:
+    if orjson is None:
+        raise RuntimeError("FAST_JSON requires the orjson package")
+    return orjson.dumps(content)
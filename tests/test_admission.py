@@ -0,0 +1,107 @@
+import asyncio
+
+import pytest
+
+from src.admission import AdmissionController, AdmissionMiddleware, Shed, route_class
+
+
+def scope(method, path):
+    return {"type": "http", "method": method, "path": path, "headers": []}
+
+
+def test_route_class():
+    assert route_class(scope('GET', '/houses/')) == 'read'
+    assert route_class(scope('POST', '/houses/1/members/')) == 'write'
+    assert route_class(scope('POST', '/login')) == 'auth'
+    assert route_class(scope('GET', '/houses/export')) == 'bulk'
+    assert route_class(scope('GET', '/metrics')) is None
+
+
+def test_waiters_are_served_by_priority():
+    async def run():
+        controller = AdmissionController(1, max_queue=10)
+        await controller.acquire(0)
+        order = []
+
+        async def request(priority, name):
+            await controller.acquire(priority, name)
+            order.append(name)
+            controller.release()
+
+        tasks = [asyncio.ensure_future(request(p, n)) for p, n in ((2, 'login'), (1, 'write'), (0, 'read'))]
+        await asyncio.sleep(0)
+        assert controller.stats()['queued'] == {'login': 1, 'write': 1, 'read': 1}
+        controller.release()
+        await asyncio.gather(*tasks)
+        assert controller.in_flight == 0
+        return order
+    assert asyncio.run(run()) == ['read', 'write', 'login']
+
+
+def test_full_queue_displaces_lower_priority():
+    async def run():
+        controller = AdmissionController(1, max_queue=1)
+        await controller.acquire(0)
+        login = asyncio.ensure_future(controller.acquire(2))
+        await asyncio.sleep(0)
+        with pytest.raises(Shed, match='queue_full'):
+            await controller.acquire(2)
+        read = asyncio.ensure_future(controller.acquire(0))
+        await asyncio.sleep(0)
+        with pytest.raises(Shed, match='displaced'):
+            await login
+        controller.release()
+        await read
+        controller.release()
+        assert controller.in_flight == 0
+    asyncio.run(run())
+
+
+def test_queue_timeout_and_cancel_free_the_queue():
+    async def run():
+        controller = AdmissionController(1, queue_timeout=0.01)
+        await controller.acquire(0)
+        with pytest.raises(Shed, match='timeout'):
+            await controller.acquire(0)
+        waiter = asyncio.ensure_future(controller.acquire(0))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        assert controller.queued == 0
+        controller.release()
+        assert controller.in_flight == 0
+    asyncio.run(run())
+
+
+def test_middleware_sheds_with_retry_after():
+    release = asyncio.Event()
+
+    async def app(scope, receive, send):
+        await release.wait()
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    controller = AdmissionController(1, max_queue=0)
+    middleware = AdmissionMiddleware(app, lambda: controller, retry_after=3)
+
+    async def call(path):
+        messages = []
+
+        async def send(message):
+            messages.append(message)
+        await middleware(scope('GET', path), None, send)
+        return messages[0]
+
+    async def run():
+        admitted = asyncio.ensure_future(call('/houses/'))
+        await asyncio.sleep(0)
+        shed = await call('/houses/')
+        exempt = asyncio.ensure_future(call('/metrics'))
+        release.set()
+        return (await admitted)['status'], shed, (await exempt)['status']
+
+    status, shed, exempt = asyncio.run(run())
+    assert (status, shed['status'], exempt) == (200, 503, 200)
+    assert (b'retry-after', b'3') in shed['headers']
+    assert controller.in_flight == 0
@@ -0,0 +1,112 @@
+import asyncio
+
+import pytest
+
+from src import cache, crud, migrations, models, schemas
+from src.batching import MemberWriteBatcher
+from src.database import SessionLocal, engine
+
+
+migrations.upgrade(engine)
+
+
+@pytest.fixture
+def house_id():
+    with SessionLocal() as db:
+        house_id = crud.create_house(db, schemas.HouseBase(name='Batched House')).id
+    yield house_id
+    with SessionLocal() as db:
+        crud.delete_house(db, house_id)
+
+
+class CountingSessions:
+    def __init__(self):
+        self.sessions = 0
+
+    def __call__(self):
+        self.sessions += 1
+        return SessionLocal()
+
+
+def add_all(batcher, members):
+    async def run():
+        return await asyncio.gather(*(batcher.add(house_id, character) for house_id, character in members))
+    return asyncio.run(run())
+
+
+def test_concurrent_inserts_share_one_transaction(house_id):
+    sessions = CountingSessions()
+    batcher = MemberWriteBatcher(sessions, window=0.01)
+    members = [(house_id, schemas.CharacterBase(name=f'Member {i}')) for i in range(5)]
+    rows = add_all(batcher, members + [(0, schemas.CharacterBase(name='Orphan'))])
+    assert sessions.sessions == 1
+    assert [row.name for row in rows[:5]] == [f'Member {i}' for i in range(5)]
+    assert {row.house_id for row in rows[:5]} == {house_id}
+    assert rows[5] is None
+
+
+def test_full_batch_is_written_without_waiting(house_id):
+    sessions = CountingSessions()
+    batcher = MemberWriteBatcher(sessions, window=60, max_size=2)
+    members = [(house_id, schemas.CharacterBase(name=f'Member {i}')) for i in range(4)]
+    rows = add_all(batcher, members)
+    assert sessions.sessions == 2
+    assert len({row.id for row in rows}) == 4
+
+
+def test_failed_batch_fails_every_caller(house_id):
+    def broken_session():
+        raise RuntimeError('database is down')
+
+    batcher = MemberWriteBatcher(broken_session, window=0.01)
+
+    async def run():
+        return await asyncio.gather(
+            *(batcher.add(house_id, schemas.CharacterBase(name='Member')) for _ in range(3)),
+            return_exceptions=True
+        )
+    assert [str(result) for result in asyncio.run(run())] == ['database is down'] * 3
+
+
+def test_failed_row_fails_only_its_caller(house_id, monkeypatch):
+    insert_returning = crud.insert_returning
+
+    def failing_insert_returning(db, table, values, conflict=None):
+        if values.get('name') == 'Bad':
+            raise ValueError('bad member')
+        return insert_returning(db, table, values, conflict)
+
+    monkeypatch.setattr(crud, 'insert_returning', failing_insert_returning)
+    batcher = MemberWriteBatcher(SessionLocal, window=0.01)
+
+    async def run():
+        return await asyncio.gather(
+            *(batcher.add(house_id, schemas.CharacterBase(name=name)) for name in ('Good', 'Bad', 'Also Good')),
+            return_exceptions=True
+        )
+    good, bad, also_good = asyncio.run(run())
+    assert (good.name, also_good.name) == ('Good', 'Also Good')
+    assert isinstance(bad, ValueError)
+    assert not batcher._writes
+
+
+class FailingChannel(cache.InvalidationChannel):
+    def publish(self, message: dict):
+        raise RuntimeError('broker is down')
+
+    def subscribe(self, callback):
+        pass
+
+
+def test_failed_invalidation_does_not_write_the_batch_again(house_id, monkeypatch):
+    monkeypatch.setattr(cache, 'houses', cache.HouseCache(channel=FailingChannel()))
+    batcher = MemberWriteBatcher(SessionLocal, window=0.01)
+
+    async def run():
+        return await asyncio.gather(
+            *(batcher.add(house_id, schemas.CharacterBase(name=f'Member {i}')) for i in range(3)),
+            return_exceptions=True
+        )
+    assert [str(result) for result in asyncio.run(run())] == ['broker is down'] * 3
+    with SessionLocal() as db:
+        assert db.query(models.Character).filter(models.Character.house_id == house_id).count() == 3
@@ -0,0 +1,111 @@
+from src.cache import HouseCache, HouseEntry, LocalChannel, TTLCache
+
+
+class FakeTimer:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_get_and_set():
+    cache = TTLCache(maxsize=2, ttl=10)
+    cache.set('key', 'value')
+    assert cache.get('key') == 'value'
+    assert cache.get('missing') is None
+    assert cache.stats() == {'size': 1, 'maxsize': 2, 'hits': 1, 'misses': 1}
+
+
+def test_entries_expire():
+    timer = FakeTimer()
+    cache = TTLCache(maxsize=2, ttl=10, timer=timer)
+    cache.set('key', 'value')
+    cache.set('short', 'value', ttl=1)
+    timer.now = 5
+    assert cache.get('key') == 'value'
+    assert cache.get('short') is None
+    timer.now = 10
+    assert cache.get('key') is None
+    assert len(cache) == 0
+
+
+def test_least_recently_used_entry_is_dropped():
+    cache = TTLCache(maxsize=2, ttl=10)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')
+    cache.set('c', 3)
+    assert cache.get('a') == 1
+    assert cache.get('b') is None
+    assert cache.get('c') == 3
+
+
+def test_evict():
+    cache = TTLCache(maxsize=3, ttl=10)
+    for key, value in (('a', 1), ('b', 2), ('c', 3)):
+        cache.set(key, value)
+    cache.evict(lambda value: value % 2)
+    assert cache.get('a') is None
+    assert cache.get('b') == 2
+    assert cache.get('c') is None
+
+
+def test_disabled_cache_stores_nothing():
+    cache = TTLCache(maxsize=2, ttl=0)
+    cache.set('key', 'value')
+    assert cache.get('key') is None
+
+
+def make_entry(ids, page=None):
+    return HouseEntry(body=b'[]', etag='"etag"', ids=tuple(ids), page=page)
+
+
+def test_house_updated_evicts_entries_containing_it():
+    houses = HouseCache()
+    houses.set('house', make_entry([2]), houses.generation)
+    houses.set('page', make_entry([1, 2, 3], page=(None, 3)), houses.generation)
+    houses.set('other page', make_entry([4, 5, 6], page=(3, 3)), houses.generation)
+    houses.house_updated(2)
+    assert houses.get('house') is None
+    assert houses.get('page') is None
+    assert houses.get('other page') is not None
+
+
+def test_houses_added_or_removed_evicts_shifted_pages():
+    houses = HouseCache()
+    entries = {
+        'house': make_entry([2]),
+        'first page': make_entry([1, 2], page=(None, 2)),
+        'second page': make_entry([3, 4], page=(None, 2)),
+        'last page': make_entry([5], page=(4, 2)),
+        'cursor page': make_entry([1, 2], page=(0, 2)),
+    }
+    for key, entry in entries.items():
+        houses.set(key, entry, houses.generation)
+    houses.houses_added_or_removed([3])
+    assert houses.get('house') is not None
+    assert houses.get('first page') is not None
+    assert houses.get('second page') is None
+    assert houses.get('last page') is not None
+    assert houses.get('cursor page') is not None
+
+    houses.houses_added_or_removed([7])
+    assert houses.get('last page') is None
+    assert houses.get('first page') is not None
+
+
+def test_stale_entries_are_not_stored():
+    houses = HouseCache()
+    generation = houses.generation
+    houses.pages_reset()
+    houses.set('page', make_entry([1], page=(None, 2)), generation)
+    assert houses.get('page') is None
+
+
+def test_invalidation_reaches_other_workers():
+    channel = LocalChannel()
+    worker_a, worker_b = HouseCache(channel=channel), HouseCache(channel=channel)
+    worker_b.set('house', make_entry([1]), worker_b.generation)
+    worker_a.house_updated(1)
+    assert worker_b.get('house') is None
@@ -0,0 +1,76 @@
+import gzip
+
+import brotli
+import pytest
+
+from fastapi.testclient import TestClient
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, Response, StreamingResponse
+
+from src.compression import CompressionMiddleware, choose_encoding
+
+
+BIG = [{'name': f'Member {i}', 'titles': 'Lord of Winterfell'} for i in range(200)]
+
+
+@pytest.fixture
+def client():
+    app = Starlette()
+
+    @app.route('/big')
+    def big(request):
+        return JSONResponse(BIG, headers={'ETag': '"v1"'})
+
+    @app.route('/small')
+    def small(request):
+        return JSONResponse({'name': 'Stark'}, headers={'ETag': '"v1"'})
+
+    @app.route('/stream')
+    def stream(request):
+        return StreamingResponse((b'{"line": %d}\n' % i for i in range(500)), media_type='application/x-ndjson')
+
+    @app.route('/binary')
+    def binary(request):
+        return Response(b'\0' * 5000, media_type='application/octet-stream')
+
+    app.add_middleware(CompressionMiddleware, encodings=['br', 'gzip'], minimum_size=500)
+    return TestClient(app)
+
+
+def test_choose_encoding():
+    assert choose_encoding('gzip, deflate, br', ['br', 'gzip']) == 'br'
+    assert choose_encoding('gzip;q=1.0, br;q=0.5', ['br', 'gzip']) == 'gzip'
+    assert choose_encoding('br;q=0, *', ['br', 'gzip']) == 'gzip'
+    assert choose_encoding('identity', ['br', 'gzip']) is None
+    assert choose_encoding('', ['br', 'gzip']) is None
+
+
+def test_compresses_large_responses(client):
+    response = client.get('/big', headers={'Accept-Encoding': 'gzip'}, stream=True)
+    body = response.raw.read(decode_content=False)
+    assert response.headers['content-encoding'] == 'gzip'
+    assert response.headers['vary'] == 'Accept-Encoding'
+    assert response.headers['etag'] == 'W/"v1"'
+    assert int(response.headers['content-length']) == len(body)
+    assert gzip.decompress(body) == JSONResponse(BIG).body
+
+    response = client.get('/big', headers={'Accept-Encoding': 'br'}, stream=True)
+    assert response.headers['content-encoding'] == 'br'
+    assert brotli.decompress(response.raw.read(decode_content=False)) == JSONResponse(BIG).body
+
+
+def test_leaves_small_binary_and_unaccepted_responses(client):
+    small = client.get('/small', headers={'Accept-Encoding': 'gzip'})
+    assert 'content-encoding' not in small.headers and small.json() == {'name': 'Stark'}
+    assert small.headers['etag'] == 'W/"v1"'
+    assert 'content-encoding' not in client.get('/binary', headers={'Accept-Encoding': 'gzip'}).headers
+    identity = client.get('/big', headers={'Accept-Encoding': 'identity'})
+    assert 'content-encoding' not in identity.headers and identity.headers['etag'] == '"v1"'
+
+
+def test_compresses_streaming_responses(client):
+    response = client.get('/stream', headers={'Accept-Encoding': 'gzip'}, stream=True)
+    assert response.headers['content-encoding'] == 'gzip'
+    assert 'content-length' not in response.headers
+    lines = gzip.decompress(response.raw.read(decode_content=False)).splitlines()
+    assert len(lines) == 500 and lines[-1] == b'{"line": 499}'
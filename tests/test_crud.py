@@ -1,13 +1,17 @@
+import asyncio
+
 from contextlib import contextmanager
 from typing import List
 
 import pytest
 
-from src import crud, models, schemas
-from src.database import engine, SessionLocal
+from src import crud, migrations, models, records, schemas, search
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+from src.database import engine, get_async_url, SessionLocal
 
 
-models.Base.metadata.create_all(bind=engine)
+migrations.upgrade(engine)
 
 
 @contextmanager
@@ -19,6 +23,17 @@ def get_db():
             db.close()
 
 
+def run_async(fn, *args, **kwargs):
+    async def run():
+        async_engine = create_async_engine(get_async_url(str(engine.url)))
+        try:
+            async with AsyncSession(async_engine, expire_on_commit=False) as db:
+                return await fn(db, *args, **kwargs)
+        finally:
+            await async_engine.dispose()
+    return asyncio.run(run())
+
+
 @pytest.fixture
 def user():
     user = schemas.UserCreate(email='test@domain.com', password='secret')
@@ -39,11 +54,17 @@ def house():
 
 def test_create_user(user):
     _, test_user = user
-    assert isinstance(test_user, models.User)
     assert test_user.is_active == True
     assert crud.verify_password('secret', test_user.hashed_password) == True
 
 
+def test_create_user_with_registered_email(user):
+    db, test_user = user
+    with pytest.raises(crud.AlreadyExists):
+        crud.create_user(db, schemas.UserCreate(email=test_user.email, password='other'))
+    assert crud.read_user_by_email(db, test_user.email).hashed_password == test_user.hashed_password
+
+
 def test_read_user(user):
     db, test_user = user
     db_user = crud.read_user(db=db, user_id=test_user.id)
@@ -66,6 +87,20 @@ def test_read_users(user):
     assert isinstance(db_users[0], models.User)
 
 
+def test_async_read_user_by_email(user):
+    _, test_user = user
+    db_user = run_async(crud.async_read_user_by_email, email='test@domain.com')
+    assert db_user.id == test_user.id
+    assert run_async(crud.async_read_user_by_email, email='unknown@domain.com') is None
+
+
+def test_read_users_after_id(user):
+    db, test_user = user
+    db_users = crud.read_users(db, after_id=test_user.id - 1, limit=1)
+    assert [db_user.id for db_user in db_users] == [test_user.id]
+    assert crud.read_users(db, after_id=test_user.id) == []
+
+
 def test_delete_user(user):
     db, test_user = user
     rows = crud.delete_user(db, test_user.id)
@@ -74,24 +109,167 @@ def test_delete_user(user):
 
 def test_create_house(house):
     _, test_house = house
-    assert isinstance(test_house, models.House)
-    assert isinstance(test_house.members, List)
+    assert isinstance(test_house, records.HouseRecord)
+    assert test_house.members == []
+    assert test_house.version == 1
     assert test_house.name == 'Test House'
     assert test_house.words == 'Words'
     assert test_house.description == 'Description'
 
 
+def test_read_houses_after_id(house):
+    db, test_house = house
+    db_houses = crud.read_houses(db, after_id=test_house.id - 1, limit=1)
+    assert [db_house.id for db_house in db_houses] == [test_house.id]
+    assert crud.read_houses(db, after_id=test_house.id) == []
+
+
+def test_async_read_houses(house):
+    db, test_house = house
+    crud.create_house_member(db, schemas.CharacterBase(name='Test Character'), test_house.id)
+    for members in crud.members_loaders:
+        db_houses = run_async(crud.async_read_houses, after_id=test_house.id - 1, limit=1, members=members)
+        assert [db_house.id for db_house in db_houses] == [test_house.id]
+        assert 'Test Character' in [member.name for member in db_houses[0].members]
+
+
+def test_async_read_house_by_name(house):
+    _, test_house = house
+    for members in crud.members_loaders:
+        db_house = run_async(crud.async_read_house_by_name, name='Test House', members=members)
+        assert db_house.id == test_house.id
+        assert isinstance(db_house.members, List)
+
+
+def test_house_names_are_case_insensitive(house):
+    db, test_house = house
+    assert crud.read_house_record_by_name(db, name='TEST house').id == test_house.id
+    with pytest.raises(crud.AlreadyExists):
+        crud.create_house(db, schemas.HouseBase(name='test HOUSE'))
+    result = crud.import_houses(db, [schemas.HouseImport(name='Test house')])
+    assert result.houses == 0 and [error.index for error in result.errors] == [0]
+
+
+def test_read_house_records(house):
+    db, test_house = house
+    crud.create_house_member(db, schemas.CharacterBase(name='Test Character'), test_house.id)
+    expected = schemas.House.from_orm(crud.read_house_by_name(db, name='Test House'))
+    for members in crud.members_loaders:
+        records = crud.read_house_records(db, after_id=test_house.id - 1, limit=1, members=members)
+        assert [schemas.House.from_orm(record) for record in records] == [expected]
+        assert run_async(crud.async_read_house_records, after_id=test_house.id - 1, limit=1, members=members) == records
+        record = crud.read_house_record_by_name(db, name='Test House', members=members)
+        assert record == records[0]
+        assert run_async(crud.async_read_house_record_by_name, name='Test House', members=members) == record
+        assert crud.read_house_record_by_name(db, name='Unknown', members=members) is None
+
+
+def test_read_user_rows(user):
+    db, test_user = user
+    rows = crud.read_user_rows(db, after_id=test_user.id - 1, limit=1)
+    assert [schemas.User.from_orm(row) for row in rows] == [schemas.User.from_orm(test_user)]
+    assert crud.read_user_rows(db, after_id=test_user.id) == []
+
+
+def test_stream_houses(house):
+    db, test_house = house
+    character = schemas.CharacterBase(name='Test Character')
+    crud.create_house_member(db, character, test_house.id)
+    streamed = {house['id']: house for house in crud.stream_houses(db, batch_size=1)}
+    assert streamed[test_house.id]['name'] == 'Test House'
+    assert 'Test Character' in [member['name'] for member in streamed[test_house.id]['members']]
+
+
 def test_create_house_member(house):
     db, test_house = house
     character = schemas.CharacterBase(name='Test Character')
     test_character = crud.create_house_member(db, character, test_house.id)
-    assert isinstance(test_character, models.Character)
-    assert isinstance(test_character.house, models.House)
     assert test_character.name == 'Test Character'
-    assert test_character.house.name == 'Test House'
+    assert test_character.house_id == test_house.id
+    assert crud.read_house_version(db, 'Test House').version == 2
+    assert crud.create_house_member(db, character, 0) is None
+
+
+def test_create_house_members(house):
+    db, test_house = house
+    members = [(test_house.id, schemas.CharacterBase(name=f'Member {i}')) for i in range(3)]
+    rows = crud.create_house_members(db, members + [(0, schemas.CharacterBase(name='Orphan'))])
+    assert [row.name for row in rows[:3]] == ['Member 0', 'Member 1', 'Member 2']
+    assert rows[3] is None
+    assert crud.read_house_version(db, 'Test House').version == 2
+
+
+def test_import_houses(house):
+    db, test_house = house
+    houses = [
+        schemas.HouseImport(name=f'Imported House {i}', members=[schemas.CharacterBase(name='Member')])
+        for i in range(3)
+    ]
+    houses.insert(1, schemas.HouseImport(name=test_house.name.upper()))
+    houses.append(schemas.HouseImport(name='imported house 0'))
+    result = crud.import_houses(db, houses, batch_size=2)
+    assert result.houses == 3
+    assert result.members == 3
+    assert [error.index for error in result.errors] == [1, 4]
+    assert {error.detail for error in result.errors} == {'House already registered'}
+    for i in range(3):
+        db_house = crud.read_house_by_name(db, name=f'Imported House {i}')
+        assert 'Member' in [member.name for member in db_house.members]
+        crud.delete_house(db, db_house.id)
+
+
+def search_kinds(db, q):
+    return {(result.kind, result.id) for result in search.search(db, q)}
+
+
+def test_search_follows_house_writes(house):
+    db, test_house = house
+    house_id = test_house.id
+    assert ('house', house_id) in search_kinds(db, 'Test Words')
+
+    crud.update_house(db, house_id, schemas.HouseBase(name='Test House', words='Fire and Blood'))
+    assert ('house', house_id) not in search_kinds(db, 'Words')
+    assert ('house', house_id) in search_kinds(db, 'blood')
+
+    crud.delete_house(db, house_id)
+    assert ('house', house_id) not in search_kinds(db, 'blood')
+
+
+def test_search_members(house):
+    db, test_house = house
+    character = schemas.CharacterBase(name='Searchable Character', titles='Lord of Winterfell')
+    test_character = crud.create_house_member(db, character, test_house.id)
+    results = search.search(db, 'winterf')
+    assert ('character', test_character.id) in {(result.kind, result.id) for result in results}
+    assert search.search(db, '!!!') == []
+
+
+def test_search_imported_houses(house):
+    db, _ = house
+    # Documents that do not match keep the terms rare, so bm25 ranks the shorter, denser name first
+    fillers = [schemas.HouseImport(name=f'Filler House {i}') for i in range(4)]
+    houses = [schemas.HouseImport(
+        name='Imported Searchable House',
+        members=[schemas.CharacterBase(name='Imported Searchable Member, Sworn Sword')]
+    )]
+    crud.import_houses(db, fillers + houses)
+    results = search.search(db, 'imported searchable')
+    assert {result.kind for result in results} == {'house', 'character'}
+    assert results[0].kind == 'house'
+    for imported in fillers + houses:
+        crud.delete_house(db, crud.read_house_by_name(db, imported.name).id)
 
 
 def test_delete_house(house):
     db, test_house = house
     rows = crud.delete_house(db, test_house.id)
     assert rows == 1
+
+
+def test_delete_house_deletes_its_members(house):
+    db, test_house = house
+    character = crud.create_house_member(db, schemas.CharacterBase(name='Orphaned Character'), test_house.id)
+    assert ('character', character.id) in search_kinds(db, 'orphaned')
+    crud.delete_house(db, test_house.id)
+    assert ('character', character.id) not in search_kinds(db, 'orphaned')
+    assert db.query(models.Character).filter(models.Character.house_id == test_house.id).count() == 0
@@ -0,0 +1,76 @@
+import threading
+
+import pytest
+
+from sqlalchemy.exc import TimeoutError
+
+from src.database import create_db_engine, get_async_url
+from src.metrics import Histogram, PoolStats
+
+
+@pytest.fixture
+def pool_engine(tmp_path, monkeypatch):
+    monkeypatch.setattr('src.database.pool_options', {
+        "pool_size": 1, "max_overflow": 0, "pool_timeout": 0.05, "pool_recycle": -1, "pool_pre_ping": True
+    })
+    stats = PoolStats()
+    engine = create_db_engine(f"sqlite:///{tmp_path / 'pool.db'}", stats)
+    yield engine, stats
+    engine.dispose()
+
+
+def test_get_async_url():
+    assert get_async_url('sqlite:///./test.db') == 'sqlite+aiosqlite:///./test.db'
+    assert get_async_url('postgresql://user@host/db') == 'postgresql+asyncpg://user@host/db'
+
+
+def test_pool_stats(pool_engine):
+    engine, stats = pool_engine
+    with engine.connect():
+        assert stats.checked_out == 1
+        with pytest.raises(TimeoutError):
+            engine.connect()
+    with engine.connect():
+        pass
+    snapshot = stats.snapshot()
+    assert snapshot['checked_out'] == 0
+    assert snapshot['created'] == 1
+    assert snapshot['wait_seconds']['count'] == 3
+    assert snapshot['wait_seconds']['sum'] >= 0.05
+
+
+def test_pool_stats_survive_dispose(pool_engine):
+    engine, stats = pool_engine
+    with engine.connect():
+        pass
+    engine.dispose()
+    assert stats.discarded == 1
+    with engine.connect():
+        pass
+    assert stats.created == 2
+    assert stats.wait.count == 2
+
+
+def test_pool_stats_from_threads(pool_engine):
+    engine, stats = pool_engine
+
+    def connect():
+        with engine.connect():
+            pass
+
+    threads = [threading.Thread(target=connect) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert stats.checked_out == 0
+    assert stats.wait.count == 4
+
+
+def test_histogram():
+    histogram = Histogram(buckets=(0.1, 1))
+    for value in (0.05, 0.1, 0.5, 2):
+        histogram.observe(value)
+    assert histogram.snapshot() == {
+        'buckets': {'0.1': 2, '1': 3, '+Inf': 4}, 'count': 4, 'sum': 2.65
+    }
@@ -0,0 +1,27 @@
+from types import SimpleNamespace
+
+from src.etags import compute_etag, etag_matches
+
+
+def make_house(**fields):
+    house = dict(id=1, version=1, name='House', words=None, description=None)
+    house.update(fields)
+    return SimpleNamespace(**house)
+
+
+def test_compute_etag():
+    etag = compute_etag([make_house()])
+    assert etag.startswith('"') and etag.endswith('"')
+    assert compute_etag([make_house()]) == etag
+    assert compute_etag([make_house(version=2)]) != etag
+    assert compute_etag([make_house(words='Words')]) != etag
+    assert compute_etag([make_house(), make_house(id=2)]) != etag
+
+
+def test_etag_matches():
+    assert etag_matches('"a"', '"a"')
+    assert etag_matches('"b", "a"', '"a"')
+    assert etag_matches('W/"a"', '"a"')
+    assert etag_matches('*', '"a"')
+    assert not etag_matches('"b"', '"a"')
+    assert not etag_matches(None, '"a"')
@@ -0,0 +1,47 @@
+import asyncio
+import threading
+
+import pytest
+
+from src.hashing import HashingPool, HashingPoolBusy
+
+
+def test_run():
+    pool = HashingPool(workers=1)
+    assert asyncio.run(pool.run(pow, 2, 10)) == 1024
+    pool.shutdown()
+
+
+def test_run_in_request_threadpool():
+    pool = HashingPool(workers=0)
+    assert asyncio.run(pool.run(pow, 2, 10)) == 1024
+
+
+def test_run_times_out_while_queued():
+    pool = HashingPool(workers=1, queue_timeout=0.01)
+    release = threading.Event()
+    pool.executor.submit(release.wait)
+    with pytest.raises(HashingPoolBusy):
+        asyncio.run(pool.run(pow, 2, 10))
+    release.set()
+    pool.shutdown()
+
+
+def test_running_call_is_not_cancelled():
+    pool = HashingPool(workers=1, queue_timeout=0.1)
+    started, release = threading.Event(), threading.Event()
+
+    def slow():
+        started.set()
+        release.wait()
+        return 'done'
+
+    async def run():
+        task = asyncio.ensure_future(pool.run(slow))
+        await asyncio.get_running_loop().run_in_executor(None, started.wait)
+        await asyncio.sleep(0.2)
+        release.set()
+        return await task
+
+    assert asyncio.run(run()) == 'done'
+    pool.shutdown()
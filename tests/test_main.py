@@ -1,13 +1,25 @@
+import json
+import time
+
 from contextlib import contextmanager
 from typing import List
 
 import pytest
 
 from fastapi.testclient import TestClient
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from passlib.context import CryptContext
+
+from src import batching, cache, crud, database, hashing, main, migrations, pagination, replicas, schemas
+from src.database import SessionLocal, create_db_engine, engine, get_async_url, get_primary_read_db, get_read_db
+from src.main import app, create_access_token, get_current_user
+from src.metrics import PoolStats
+
 
-from src import crud, schemas
-from src.database import SessionLocal
-from src.main import app, get_current_user
+migrations.upgrade(engine)
 
 
 def override_get_current_user():
@@ -33,6 +45,20 @@ def get_db():
             db.close()
 
 
+@contextmanager
+def count_queries():
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
 @pytest.fixture
 def user():
     user = schemas.UserCreate(email='test@mail.com', password='secret')
@@ -51,12 +77,74 @@ def house():
         crud.delete_house(db=db, house_id=test_house.id)
 
 
+@pytest.fixture
+def async_read_db():
+    async_engine = create_async_engine(get_async_url(str(engine.url)))
+    AsyncTestSession = sessionmaker(bind=async_engine, class_=AsyncSession, expire_on_commit=False)
+
+    async def override_get_read_db():
+        async with AsyncTestSession() as db:
+            yield db
+
+    app.dependency_overrides[get_read_db] = override_get_read_db
+    app.dependency_overrides[get_primary_read_db] = override_get_read_db
+    yield
+    app.dependency_overrides = {}
+
+
+@pytest.fixture
+def no_house_cache(monkeypatch):
+    monkeypatch.setattr(cache, 'houses', cache.HouseCache(maxsize=0))
+
+
+@pytest.fixture
+def houses_with_members():
+    with get_db() as db:
+        test_houses = []
+        for i in range(5):
+            house = schemas.HouseBase(name=f'Test House {i}')
+            test_house = crud.create_house(db=db, house=house)
+            for j in range(3):
+                character = schemas.CharacterBase(name=f'Member {j}')
+                crud.create_house_member(db, character, test_house.id)
+            test_houses.append(test_house)
+        yield db, test_houses
+        for test_house in test_houses:
+            crud.delete_house(db=db, house_id=test_house.id)
+
+
 def test_read_root():
     response = client.get("/")
     assert response.status_code == 200
     assert response.json() == "Valar Morghulis"
 
 
+def test_read_pool_stats():
+    client.get('/houses/')
+    response = client.get('/stats/pool')
+    primary = response.json()['primary']
+    assert response.status_code == 200
+    assert primary['created'] >= 1
+    assert primary['wait_seconds']['count'] >= 1
+
+
+def test_read_metrics(user):
+    _, test_user = user
+    client.get('/houses/')
+    client.post('/login', data={'username': test_user.email, 'password': 'secret'})
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert response.headers['content-type'].startswith('text/plain')
+    samples = dict(line.rsplit(' ', 1) for line in response.text.splitlines() if not line.startswith('#'))
+    assert int(samples['http_request_duration_seconds_count{method="GET",route="/houses/",status="200"}']) >= 1
+    assert float(samples['http_request_db_statements_sum{method="GET",route="/houses/"}']) >= 0
+    assert float(samples['http_request_db_statements_sum{method="POST",route="/login"}']) >= 1
+    assert float(samples['http_requests_in_progress{method="GET",route="/metrics"}']) == 1
+    assert int(samples['password_verify_seconds_count']) >= 1
+    assert 'db_pool_checked_out{engine="primary"}' in samples
+    assert 'cache_hits_total{cache="houses"}' in samples
+
+
 def test_login_without_credentials():
     response = client.post("/login")
     assert response.status_code == 422
@@ -97,6 +185,32 @@ def test_login(user):
     assert response.json()['token_type'] == "bearer"
 
 
+def test_login_rehashes_outdated_password():
+    outdated_hash = CryptContext(schemes=["bcrypt"], bcrypt__rounds=4).hash('secret')
+    user = schemas.UserCreate(email='test@mail.com', password='secret')
+    with get_db() as db:
+        test_user = crud.create_user(db=db, user=user, hashed_password=outdated_hash)
+        body = {'username': test_user.email, 'password': 'secret'}
+        response = client.post("/login", data=body)
+        assert response.status_code == 200
+        hashed_password = crud.read_user(db, test_user.id).hashed_password
+        assert hashed_password != outdated_hash
+        assert crud.verify_password('secret', hashed_password)
+        crud.delete_user(db=db, user_id=test_user.id)
+
+
+def test_login_when_hashing_pool_is_busy(user, monkeypatch):
+    _, test_user = user
+    busy_pool = hashing.HashingPool(workers=1, queue_timeout=0.01)
+    monkeypatch.setattr(hashing, 'pool', busy_pool)
+    busy_pool.executor.submit(time.sleep, 0.5)
+    body = {'username': test_user.email, 'password': 'secret'}
+    response = client.post("/login", data=body)
+    assert response.status_code == 503
+    assert response.headers['retry-after'] == '1'
+    busy_pool.shutdown()
+
+
 def test_create_user_without_credentials():
     body = {'email': 'new_test@mail.com', 'password': 'secret'}
     response = client.post("/users/", json=body) 
@@ -139,6 +253,81 @@ def test_create_user():
         app.dependency_overrides = {}
 
 
+def test_read_users(user):
+    app.dependency_overrides[get_current_user] = override_get_current_user
+
+    _, test_user = user
+    response = client.get('/users/?limit=1')
+    assert response.status_code == 200
+    assert len(response.json()) == 1
+    assert 'cursor=' in response.headers['link']
+
+    app.dependency_overrides = {}
+
+
+def test_current_user_is_cached_until_deleted(user):
+    db, test_user = user
+    cache.principals.clear()
+    token = create_access_token(data={'sub': test_user.email, 'scopes': 'users:read'})
+    headers = {'Authorization': f'Bearer {token}'}
+
+    response = client.get('/users/', headers=headers)
+    assert response.status_code == 200
+    with count_queries() as statements:
+        response = client.get('/users/', headers=headers)
+    assert response.status_code == 200
+    assert len(statements) == 1
+    assert client.get('/stats/cache').json()['principals']['hits'] >= 1
+
+    crud.delete_user(db, test_user.id)
+    response = client.get('/users/', headers=headers)
+    assert response.status_code == 401
+
+
+def test_current_user_is_rejected_once_deactivated(user):
+    db, test_user = user
+    token = create_access_token(data={'sub': test_user.email, 'scopes': 'users:read'})
+    headers = {'Authorization': f'Bearer {token}'}
+
+    assert client.get('/users/', headers=headers).status_code == 200
+    crud.deactivate_user(db, test_user.id)
+    response = client.get('/users/', headers=headers)
+    assert response.status_code == 400
+    assert response.json() == {'detail': 'Inactive user'}
+
+
+def test_verified_tokens_are_cached(user, monkeypatch):
+    from jose import jwt
+
+    _, test_user = user
+    decode = jwt.decode
+    decoded = []
+    monkeypatch.setattr(jwt, 'decode', lambda *args, **kwargs: decoded.append(args[0]) or decode(*args, **kwargs))
+    token = create_access_token(data={'sub': test_user.email, 'scopes': 'users:read houses:read'})
+    headers = {'Authorization': f'Bearer {token}'}
+
+    assert client.get('/users/', headers=headers).status_code == 200
+    assert client.get('/users/', headers=headers).status_code == 200
+    assert client.delete(f'/users/{test_user.id}', headers=headers).status_code == 401
+    assert decoded == [token]
+    assert cache.tokens.get(token) == cache.TokenClaims(test_user.email, frozenset({'users:read', 'houses:read'}))
+
+    assert client.get('/users/', headers={'Authorization': 'Bearer invalid'}).status_code == 401
+    assert cache.tokens.get('invalid') is None
+
+
+def test_cached_token_expires_with_token(user):
+    from jose import jwt
+
+    _, test_user = user
+    claims = {'sub': test_user.email, 'scopes': 'users:read', 'exp': int(time.time()) + 1}
+    token = jwt.encode(claims, main.SECRET_KEY, algorithm=main.ALGORITHM)
+    assert client.get('/users/', headers={'Authorization': f'Bearer {token}'}).status_code == 200
+    assert cache.tokens.get(token) is not None
+    time.sleep(1.1)
+    assert cache.tokens.get(token) is None
+
+
 def test_delete_user_without_permission(user):
     _, test_user = user
     response = client.delete(f"/users/{test_user.id}")
@@ -178,12 +367,185 @@ def test_create_house():
         app.dependency_overrides = {}
 
 
+def test_import_houses_without_permission():
+    response = client.post('/houses/import', json=[{'name': 'Imported House'}])
+    assert response.status_code == 401
+
+
+def test_import_houses(house):
+    app.dependency_overrides[get_current_user] = override_get_current_user
+
+    db, test_house = house
+    houses = [
+        {'name': 'Imported House 1', 'members': [{'name': 'Member 1'}, {'name': 'Member 2'}]},
+        {'name': test_house.name},
+        {'words': 'No Name'},
+        {'name': 'Imported House 2', 'words': 'Words'},
+        {'name': 'Imported House 1'}
+    ]
+    response = client.post('/houses/import', json=houses)
+    result = response.json()
+    assert response.status_code == 200
+    assert result['houses'] == 2
+    assert result['members'] == 2
+    assert [error['index'] for error in result['errors']] == [1, 2, 4]
+
+    imported = crud.read_house_by_name(db, name='Imported House 1')
+    assert [member.name for member in imported.members] == ['Member 1', 'Member 2']
+    for name in ('Imported House 1', 'Imported House 2'):
+        crud.delete_house(db, crud.read_house_by_name(db, name=name).id)
+
+    app.dependency_overrides = {}
+
+
+def test_import_houses_from_ndjson():
+    app.dependency_overrides[get_current_user] = override_get_current_user
+
+    body = '{"name": "Imported House 1"}\n{"name": "Imported House 2"}\n'
+    headers = {'Content-Type': 'application/x-ndjson'}
+    response = client.post('/houses/import', data=body, headers=headers)
+    assert response.status_code == 200
+    assert response.json() == {'houses': 2, 'members': 0, 'errors': []}
+    with get_db() as db:
+        for name in ('Imported House 1', 'Imported House 2'):
+            crud.delete_house(db, crud.read_house_by_name(db, name=name).id)
+
+    app.dependency_overrides = {}
+
+
+def test_import_houses_with_invalid_body():
+    app.dependency_overrides[get_current_user] = override_get_current_user
+
+    response = client.post('/houses/import', json={'name': 'Imported House'})
+    assert response.status_code == 400
+
+    app.dependency_overrides = {}
+
+
 def test_read_houses():
     response = client.get('/houses/')
     assert response.status_code == 200
     assert isinstance(response.json(), List)
 
 
+def test_read_houses_loads_members_in_bounded_queries(houses_with_members):
+    _, test_houses = houses_with_members
+    house_ids = [test_house.id for test_house in test_houses]
+    with count_queries() as statements:
+        response = client.get('/houses/')
+    read_houses = {house['id']: house for house in response.json()}
+    assert response.status_code == 200
+    for house_id in house_ids:
+        assert len(read_houses[house_id]['members']) == 3
+    assert len(statements) <= 2
+
+
+def test_read_houses_loads_members_in_batches(houses_with_members, no_house_cache, monkeypatch):
+    monkeypatch.setattr(crud, 'MEMBERS_BATCH_SIZE', 2)
+    _, test_houses = houses_with_members
+    house_ids = [test_house.id for test_house in test_houses]
+    with count_queries() as statements:
+        response = client.get('/houses/', params={'cursor': pagination.encode_cursor(house_ids[0] - 1), 'limit': 5})
+    assert response.status_code == 200
+    read_houses = {house['id']: house for house in response.json()}
+    for house_id in house_ids:
+        assert [member['name'] for member in read_houses[house_id]['members']] == ['Member 0', 'Member 1', 'Member 2']
+    assert len(statements) == 4
+
+
+def test_read_house_loads_members_in_one_query(houses_with_members):
+    _, test_houses = houses_with_members
+    house_name = test_houses[0].name
+    with count_queries() as statements:
+        response = client.get(f'/houses/{house_name}')
+    assert response.status_code == 200
+    assert len(response.json()['members']) == 3
+    assert len(statements) == 1
+
+
+def test_read_houses_with_async_session(houses_with_members, async_read_db):
+    _, test_houses = houses_with_members
+    house_ids = [test_house.id for test_house in test_houses]
+    response = client.get('/houses/?limit=2')
+    assert response.status_code == 200
+    assert len(response.json()) == 2
+    assert 'cursor=' in response.headers['link']
+    read_houses = {house['id']: house for house in client.get('/houses/').json()}
+    for house_id in house_ids:
+        assert len(read_houses[house_id]['members']) == 3
+
+
+def test_read_house_with_async_session(houses_with_members, async_read_db):
+    _, test_houses = houses_with_members
+    house_name = test_houses[0].name
+    response = client.get(f'/houses/{house_name}')
+    assert response.status_code == 200
+    assert response.json()['name'] == house_name
+    assert len(response.json()['members']) == 3
+    assert client.get('/houses/Unknown').status_code == 404
+
+
+def test_current_user_with_async_session(user, async_read_db):
+    _, test_user = user
+    cache.principals.clear()
+    token = create_access_token(data={'sub': test_user.email, 'scopes': 'users:read'})
+    response = client.get('/users/', headers={'Authorization': f'Bearer {token}'})
+    assert response.status_code == 200
+
+
+def test_read_houses_with_cursor(houses_with_members):
+    _, test_houses = houses_with_members
+    house_ids = [test_house.id for test_house in test_houses]
+    read_ids = []
+    response = client.get('/houses/?limit=2')
+    while True:
+        assert response.status_code == 200
+        read_ids.extend(house['id'] for house in response.json())
+        if 'link' not in response.headers:
+            break
+        next_url = response.headers['link'].split(';')[0].strip('<>')
+        assert 'cursor=' in next_url
+        response = client.get(next_url)
+    assert read_ids == sorted(set(read_ids))
+    assert set(house_ids) <= set(read_ids)
+
+
+def test_read_houses_with_invalid_cursor():
+    response = client.get('/houses/?cursor=invalid')
+    assert response.status_code == 400
+    assert response.json() == {'detail': 'Invalid cursor'}
+
+
+def test_export_houses(houses_with_members):
+    _, test_houses = houses_with_members
+    house_ids = [test_house.id for test_house in test_houses]
+    with count_queries() as statements:
+        response = client.get('/houses/export')
+    exported = [json.loads(line) for line in response.text.splitlines()]
+    exported_houses = {house['id']: house for house in exported}
+    assert response.status_code == 200
+    assert response.headers['content-type'] == 'application/x-ndjson'
+    assert len(exported_houses) == len(exported)
+    for house_id in house_ids:
+        members = exported_houses[house_id]['members']
+        assert len(members) == 3
+        assert all(member['house_id'] == house_id for member in members)
+    assert len(statements) == 1
+
+
+def test_read_houses_fast_json(houses_with_members, no_house_cache, monkeypatch):
+    _, test_houses = houses_with_members
+    name = test_houses[0].name
+    responses = []
+    for fast_json in (False, True):
+        monkeypatch.setattr(main, 'FAST_JSON', fast_json)
+        responses.append((client.get('/houses/?limit=1000'), client.get(f'/houses/{name}')))
+    for default, fast in zip(*responses):
+        assert fast.status_code == 200
+        assert fast.content == default.content
+        assert fast.headers['etag'] == default.headers['etag']
+
+
 def test_read_house(house):
     _, test_house = house
     response = client.get(f'/houses/{test_house.name}')
@@ -195,6 +557,201 @@ def test_read_house(house):
     assert read_house['description'] == test_house.description
 
 
+def test_read_house_with_etag(house, no_house_cache):
+    db, test_house = house
+    house_name, house_id = test_house.name, test_house.id
+    response = client.get(f'/houses/{house_name}')
+    etag = response.headers['etag']
+
+    with count_queries() as statements:
+        response = client.get(f'/houses/{house_name}', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.headers['etag'] == etag
+    assert response.content == b''
+    assert len(statements) == 1
+
+    crud.create_house_member(db, schemas.CharacterBase(name='New Member'), house_id)
+    response = client.get(f'/houses/{house_name}', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['etag'] != etag
+
+    etag = response.headers['etag']
+    crud.update_house(db, house_id, schemas.HouseBase(name=house_name, words='New Words'))
+    response = client.get(f'/houses/{house_name}', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.json()['words'] == 'New Words'
+    assert response.headers['etag'] != etag
+
+
+def test_read_house_with_etag_not_found():
+    response = client.get('/houses/Unknown', headers={'If-None-Match': '"etag"'})
+    assert response.status_code == 404
+
+
+def test_read_house_fields(houses_with_members):
+    _, test_houses = houses_with_members
+    house_name = test_houses[0].name
+    with count_queries() as statements:
+        response = client.get(f'/houses/{house_name}', params={'fields': 'name, words'})
+    assert response.status_code == 200
+    assert response.json() == {'name': house_name, 'words': None}
+    assert len(statements) == 1
+    assert 'characters' not in statements[0] and 'description' not in statements[0]
+
+    response = client.get(f'/houses/{house_name}', params={'fields': 'id', 'include': 'members'})
+    assert list(response.json()) == ['id', 'members']
+    assert len(response.json()['members']) == 3
+    assert response.headers['etag'] != client.get(f'/houses/{house_name}').headers['etag']
+
+
+def test_read_houses_fields(houses_with_members, no_house_cache):
+    _, test_houses = houses_with_members
+    house_ids = {test_house.id for test_house in test_houses}
+    with count_queries() as statements:
+        response = client.get('/houses/', params={'fields': 'id,name', 'limit': 1000})
+    assert response.status_code == 200
+    assert house_ids <= {house['id'] for house in response.json()}
+    assert all(list(house) == ['name', 'id'] for house in response.json())
+    assert len(statements) == 1
+
+    etag = response.headers['etag']
+    response = client.get('/houses/', params={'fields': 'id,name', 'limit': 1000}, headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert client.get('/houses/', params={'fields': 'id,crest'}).status_code == 400
+    assert client.get('/houses/', params={'include': 'allies'}).status_code == 400
+
+
+def test_read_houses_without_members_by_default(houses_with_members, monkeypatch):
+    _, test_houses = houses_with_members
+    monkeypatch.setattr(main, 'HOUSE_INCLUDE_MEMBERS', False)
+    house = client.get(f'/houses/{test_houses[0].name}').json()
+    assert list(house) == ['name', 'words', 'description', 'id']
+    house = client.get(f'/houses/{test_houses[0].name}', params={'include': 'members'}).json()
+    assert len(house['members']) == 3
+
+
+def test_read_house_members(houses_with_members):
+    _, test_houses = houses_with_members
+    house_id = test_houses[0].id
+    response = client.get(f'/houses/{house_id}/members/', params={'limit': 2})
+    assert response.status_code == 200
+    first_page = response.json()
+    assert len(first_page) == 2
+    assert all(member['house_id'] == house_id for member in first_page)
+
+    with count_queries() as statements:
+        response = client.get(response.headers['link'].split(';')[0].strip('<>').replace('http://testserver', ''))
+    assert response.status_code == 200
+    assert first_page[-1]['id'] < response.json()[0]['id']
+    assert len(statements) == 1
+
+    response = client.get(f'/houses/{house_id}/members/', params={'name': 'MEMBER 1'})
+    assert {member['name'] for member in response.json()} == {'Member 1'}
+
+    for wildcard in ('%', '_', '\\'):
+        response = client.get(f'/houses/{house_id}/members/', params={'name': wildcard})
+        assert response.json() == []
+
+
+def test_read_house_members_by_name_with_wildcards(house):
+    db, test_house = house
+    house_id = test_house.id
+    for name in ('100% Stark', '100 Stark', 'Snow_1', 'Snow 1', 'C:\\Snow'):
+        crud.create_house_member(db, schemas.CharacterBase(name=name), house_id)
+    for name, matches in (('0% s', {'100% Stark'}), ('w_', {'Snow_1'}), ('C:\\', {'C:\\Snow'})):
+        response = client.get(f'/houses/{house_id}/members/', params={'name': name})
+        assert {member['name'] for member in response.json()} == matches
+
+
+def test_read_members_of_unknown_house():
+    response = client.get('/houses/0/members/')
+    assert response.status_code == 404
+    assert response.json() == {'detail': 'House not found'}
+
+
+def test_read_houses_with_etag(houses_with_members, no_house_cache):
+    db, test_houses = houses_with_members
+    house_id = test_houses[0].id
+    response = client.get('/houses/')
+    etag = response.headers['etag']
+
+    with count_queries() as statements:
+        response = client.get('/houses/', headers={'If-None-Match': f'"other", {etag}'})
+    assert response.status_code == 304
+    assert len(statements) == 1
+
+    crud.create_house_member(db, schemas.CharacterBase(name='New Member'), house_id)
+    response = client.get('/houses/', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['etag'] != etag
+
+
+def test_read_house_from_cache(house):
+    db, test_house = house
+    house_name, house_id = test_house.name, test_house.id
+    response = client.get(f'/houses/{house_name}')
+    etag = response.headers['etag']
+
+    with count_queries() as statements:
+        cached = client.get(f'/houses/{house_name}')
+        not_modified = client.get(f'/houses/{house_name}', headers={'If-None-Match': etag})
+    assert cached.json() == response.json()
+    assert cached.headers['etag'] == etag
+    assert not_modified.status_code == 304
+    assert statements == []
+
+    crud.create_house_member(db, schemas.CharacterBase(name='New Member'), house_id)
+    response = client.get(f'/houses/{house_name}')
+    assert 'New Member' in [member['name'] for member in response.json()['members']]
+
+    crud.update_house(db, house_id, schemas.HouseBase(name='Renamed House'))
+    assert client.get(f'/houses/{house_name}').status_code == 404
+    assert client.get('/houses/Renamed House').json()['id'] == house_id
+
+
+def test_read_houses_from_cache(houses_with_members):
+    db, test_houses = houses_with_members
+    house_ids = [test_house.id for test_house in test_houses]
+    response = client.get('/houses/?limit=2')
+    with count_queries() as statements:
+        cached = client.get('/houses/?limit=2')
+    assert cached.json() == response.json()
+    assert cached.headers['link'] == response.headers['link']
+    assert statements == []
+
+    crud.delete_house(db, response.json()[0]['id'])
+    response = client.get('/houses/?limit=2')
+    assert response.json()[0]['id'] != cached.json()[0]['id']
+
+    new_house = crud.create_house(db, schemas.HouseBase(name='New House'))
+    read_ids = [house['id'] for house in client.get('/houses/').json()]
+    assert new_house.id in read_ids
+    assert set(house_ids[1:]) <= set(read_ids)
+    crud.delete_house(db, new_house.id)
+
+
+def test_search(houses_with_members):
+    _, test_houses = houses_with_members
+    house_id = test_houses[2].id
+    response = client.get('/search', params={'q': 'test house 2'})
+    results = response.json()
+    assert response.status_code == 200
+    assert results[0] == {'kind': 'house', 'id': house_id, 'name': 'Test House 2', 'score': results[0]['score']}
+
+    response = client.get('/search', params={'q': 'member', 'limit': 2, 'skip': 1})
+    assert response.status_code == 200
+    assert len(response.json()) == 2
+    assert all(result['kind'] == 'character' for result in response.json())
+
+
+def test_search_with_async_session(houses_with_members, async_read_db):
+    _, test_houses = houses_with_members
+    response = client.get('/search', params={'q': 'test house 2'})
+    assert response.status_code == 200
+    assert response.json()[0]['id'] == test_houses[2].id
+    assert client.get('/search', params={'q': '!!!'}).json() == []
+
+
 def test_update_house_without_permission(house):
     _, test_house = house
     new_data = {'name': 'New Name', 'words': 'New Words', 'description': 'New Description'}
@@ -218,6 +775,128 @@ def test_update_house(house):
     app.dependency_overrides = {}
 
 
+def test_writes_take_one_statement_per_change(house):
+    app.dependency_overrides[get_current_user] = override_get_current_user
+    _, test_house = house
+    house_id, house_name = test_house.id, test_house.name
+
+    with count_queries() as statements:
+        response = client.post('/houses/', json={'name': house_name})
+    assert response.status_code == 400
+    assert len(statements) == 1
+
+    with count_queries() as statements:
+        response = client.post(f'/houses/{house_id}/members/', json={'name': 'Member'})
+    assert response.status_code == 201
+    # version bump, insert, search document
+    assert len(statements) == 3
+
+    with count_queries() as statements:
+        response = client.put(f'/houses/{house_name}', json={'name': house_name, 'words': 'Words'})
+    assert response.status_code == 200
+    assert response.json()['members'][-1]['name'] == 'Member'
+    # update, search document (delete and insert), members
+    assert len(statements) == 4
+
+    assert client.post('/houses/0/members/', json={'name': 'Member'}).status_code == 404
+    assert client.put('/houses/Unknown', json={'name': 'Unknown'}).status_code == 404
+    app.dependency_overrides = {}
+
+
+@pytest.fixture
+def replica_set(tmp_path, monkeypatch):
+    replica_engine = create_db_engine(f"sqlite:///{tmp_path / 'replica.db'}", PoolStats())
+    migrations.upgrade(replica_engine)
+    replica = replicas.Replica(
+        'replica_0', replica_engine, sessionmaker(bind=replica_engine, info={'replica': 'replica_0'})
+    )
+    replica_set = replicas.ReplicaSet([replica])
+    replica_set.check(replica)
+    monkeypatch.setattr(database, 'replicas', replica_set)
+    yield replica_set
+    replica_engine.dispose()
+
+
+def test_reads_go_to_replica_until_client_writes(replica_set, no_house_cache):
+    with replica_set.replicas[0].session_factory() as db:
+        crud.create_house(db, schemas.HouseBase(name='Replicated House'))
+    app.dependency_overrides[get_current_user] = override_get_current_user
+    replica_client = TestClient(app)
+    assert replica_client.get('/houses/Replicated House').status_code == 200
+    assert [result['name'] for result in replica_client.get('/search', params={'q': 'replicated'}).json()] == [
+        'Replicated House'
+    ]
+
+    response = replica_client.post('/houses/', json={'name': 'Sticky House'})
+    assert response.status_code == 201
+    assert replicas.STICKY_COOKIE in response.cookies
+    assert replica_client.get('/houses/Sticky House').status_code == 200
+    assert replica_client.get('/houses/Replicated House').status_code == 404
+    assert client.get('/houses/Sticky House').status_code == 404
+
+    replica_set.replicas[0].healthy = False
+    assert client.get('/houses/Sticky House').status_code == 200
+    with SessionLocal() as db:
+        crud.delete_house(db, response.json()['id'])
+    app.dependency_overrides = {}
+
+
+def test_sticky_client_skips_cache_filled_from_replica(replica_set):
+    with replica_set.replicas[0].session_factory() as db:
+        crud.create_house(db, schemas.HouseBase(name='Lagging House', words='Old Words'))
+    with SessionLocal() as db:
+        house_id = crud.create_house(db, schemas.HouseBase(name='Lagging House', words='Old Words')).id
+    app.dependency_overrides[get_current_user] = override_get_current_user
+    writer = TestClient(app)
+    response = writer.put('/houses/Lagging House', json={'name': 'Lagging House', 'words': 'New Words'})
+    assert response.status_code == 200
+
+    assert client.get('/houses/Lagging House').json()['words'] == 'Old Words'
+    assert writer.get('/houses/Lagging House').json()['words'] == 'New Words'
+    with SessionLocal() as db:
+        crud.delete_house(db, house_id)
+    app.dependency_overrides = {}
+
+
+def test_create_member_with_write_batching(house, monkeypatch):
+    monkeypatch.setattr(batching, 'members', batching.MemberWriteBatcher(SessionLocal, window=0.001))
+    app.dependency_overrides[get_current_user] = override_get_current_user
+    _, test_house = house
+    response = client.post(f'/houses/{test_house.id}/members/', json={'name': 'Batched'})
+    assert response.status_code == 201
+    assert response.json()['house_id'] == test_house.id
+    assert client.post('/houses/0/members/', json={'name': 'Batched'}).status_code == 404
+    app.dependency_overrides = {}
+
+
+def test_creates_take_one_statement():
+    app.dependency_overrides[get_current_user] = override_get_current_user
+    with count_queries() as statements:
+        house = client.post('/houses/', json={'name': 'Single Statement House'})
+    assert house.status_code == 201
+    # insert, search document
+    assert len(statements) == 2
+    with count_queries() as statements:
+        user = client.post('/users/', json={'email': 'single@mail.com', 'password': 'secret'})
+    assert user.status_code == 201
+    assert len(statements) == 1
+    with get_db() as db:
+        crud.delete_house(db, house.json()['id'])
+        crud.delete_user(db, user.json()['id'])
+    app.dependency_overrides = {}
+
+
+def test_rename_house_to_registered_name(houses_with_members):
+    app.dependency_overrides[get_current_user] = override_get_current_user
+    _, test_houses = houses_with_members
+    names = [test_house.name for test_house in test_houses[:2]]
+    response = client.put(f'/houses/{names[0]}', json={'name': names[1]})
+    assert response.status_code == 400
+    assert response.json() == {'detail': 'House already registered'}
+    assert client.get(f'/houses/{names[0]}').status_code == 200
+    app.dependency_overrides = {}
+
+
 def test_delete_house_without_permission(house):
     _, test_house = house
     response = client.delete(f'/houses/{test_house.id}')
@@ -0,0 +1,66 @@
+import time
+
+import pytest
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+
+from src import metrics
+
+
+def test_family_render():
+    family = metrics.Family('requests', 'Requests.', 'gauge', ('route',))
+    family.labels('/a').inc()
+    family.labels('/b').inc(2)
+    family.labels('/b').dec()
+    assert family.render() == [
+        '# HELP requests Requests.',
+        '# TYPE requests gauge',
+        'requests{route="/a"} 1',
+        'requests{route="/b"} 1',
+    ]
+
+
+def test_histogram_family_render():
+    family = metrics.Family('latency', 'Latency.', 'histogram', ('route',), buckets=(0.1, 1))
+    family.labels('/a').observe(0.5)
+    assert family.render()[2:] == [
+        'latency_bucket{route="/a",le="0.1"} 0',
+        'latency_bucket{route="/a",le="1"} 1',
+        'latency_bucket{route="/a",le="+Inf"} 1',
+        'latency_sum{route="/a"} 0.5',
+        'latency_count{route="/a"} 1',
+    ]
+
+
+def test_format_labels_escapes_values():
+    assert metrics.format_labels({'name': 'a"b\\c\nd'}) == '{name="a\\"b\\\\c\\nd"}'
+
+
+def test_timed():
+    family = metrics.Family('duration', 'Duration.', 'histogram')
+
+    @metrics.timed(family)
+    def sleep():
+        time.sleep(0.01)
+
+    sleep()
+    assert family.labels().count == 1
+    assert family.labels().sum >= 0.01
+
+
+def test_instrument_engine_counts_statements_and_forgets_failed_ones():
+    engine = metrics.instrument_engine(create_engine('sqlite://'))
+    queries = metrics.QueryStats()
+    token = metrics.current_queries.set(queries)
+    try:
+        with engine.connect() as connection:
+            for _ in range(3):
+                with pytest.raises(OperationalError):
+                    connection.execute(text('SELECT * FROM missing'))
+            connection.execute(text('SELECT 1'))
+            assert 'query_start' not in connection.info
+    finally:
+        metrics.current_queries.reset(token)
+    assert queries.statements == 1
+    assert queries.seconds > 0
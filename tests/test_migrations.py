@@ -0,0 +1,146 @@
+import json
+import os
+import subprocess
+import sys
+
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pytest
+
+from sqlalchemy import create_engine, inspect, text
+
+from src import migrations, models, search
+
+
+# Cold start of a worker, measured in a fresh interpreter. Generous for slow CI
+# machines, where they can be raised; both take around 0.4 s on a laptop.
+IMPORT_BUDGET = float(os.environ.get('STARTUP_IMPORT_BUDGET') or 1.5)
+FIRST_RESPONSE_BUDGET = float(os.environ.get('STARTUP_FIRST_RESPONSE_BUDGET') or 3.0)
+
+STARTUP_SCRIPT = """
+import json, sys, time
+import requests  # used by the test client only
+start = time.perf_counter()
+from src.main import app
+imported = time.perf_counter()
+from starlette.testclient import TestClient
+with TestClient(app) as client:
+    status = client.get('/').status_code
+    responded = time.perf_counter()
+print(json.dumps({
+    'import': imported - start,
+    'first_response': responded - start,
+    'status': status,
+    'lazy': [name for name in ('jose', 'passlib') if name not in sys.modules]
+}))
+"""
+
+
+def test_upgrade(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'fresh.db'}")
+    applied = migrations.upgrade(engine)
+    assert [migration.version for migration in applied] == [migration.version for migration in migrations.migrations]
+    assert migrations.upgrade(engine) == []
+    tables = inspect(engine).get_table_names()
+    assert {'users', 'houses', 'characters', 'search_index', 'schema_migrations'} <= set(tables)
+
+
+def test_upgrade_matches_models(tmp_path):
+    migrated, created = (create_engine(f"sqlite:///{tmp_path / name}") for name in ('migrated.db', 'created.db'))
+    migrations.upgrade(migrated)
+    models.Base.metadata.create_all(bind=created)
+
+    def schema(engine):
+        with engine.connect() as connection:
+            return {
+                table: ([column['name'] for column in inspect(connection).get_columns(table)], sorted(
+                    name for name, in connection.execute(text(
+                        "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = :table AND name LIKE 'ix_%'"
+                    ), {'table': table})
+                ))
+                for table in models.Base.metadata.tables
+            }
+
+    assert schema(migrated) == schema(created)
+
+
+def test_concurrent_upgrades_apply_each_migration_once(tmp_path):
+    engines = [create_engine(f"sqlite:///{tmp_path / 'shared.db'}") for _ in range(4)]
+    with ThreadPoolExecutor(len(engines)) as executor:
+        applied = list(executor.map(migrations.upgrade, engines))
+    assert sorted(len(versions) for versions in applied) == [0, 0, 0, len(migrations.migrations)]
+    with engines[0].connect() as connection:
+        assert connection.execute(text("SELECT count(*) FROM schema_migrations")).scalar() == len(migrations.migrations)
+
+
+def test_upgrade_database_created_before_migrations(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    with engine.begin() as connection:
+        connection.execute(text(
+            "CREATE TABLE houses (id INTEGER PRIMARY KEY, name VARCHAR, words VARCHAR, description VARCHAR)"
+        ))
+        connection.execute(text("INSERT INTO houses (name) VALUES ('Stark')"))
+        connection.execute(text(
+            "CREATE TABLE characters (id INTEGER PRIMARY KEY, name VARCHAR, titles VARCHAR, "
+            "description VARCHAR, house_id INTEGER REFERENCES houses (id))"
+        ))
+        connection.execute(text("INSERT INTO characters (name, titles, house_id) VALUES ('Arya', 'Princess', 1)"))
+    migrations.upgrade(engine)
+    documents = text("SELECT rowid, kind, ref_id, name, body FROM search_index ORDER BY rowid")
+    with engine.begin() as connection:
+        assert connection.execute(text("SELECT version FROM houses")).scalar() == 1
+        assert connection.execute(text("SELECT ref_id FROM search_index WHERE search_index MATCH 'stark'")).all()
+        migrated = connection.execute(documents).all()
+        search.rebuild_index(connection)
+        assert connection.execute(documents).all() == migrated
+
+
+def test_audit_indexes(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'indexed.db'}")
+    migrations.upgrade(engine)
+    with engine.begin() as connection:
+        connection.execute(text("DROP INDEX ix_houses_name_lower"))
+        connection.execute(text("DROP INDEX ix_characters_house_id_name"))
+        connection.execute(text("CREATE UNIQUE INDEX ix_houses_name ON houses (name)"))
+        for table, column in (('houses', 'words'), ('characters', 'id'), ('characters', 'titles')):
+            connection.execute(text(f"CREATE INDEX ix_{table}_{column} ON {table} ({column})"))
+        connection.execute(text("DELETE FROM schema_migrations WHERE version = 5"))
+    assert [migration.version for migration in migrations.upgrade(engine)] == [5]
+    with engine.connect() as connection:
+        indexes = {name for name, in connection.execute(text(
+            "SELECT name FROM sqlite_master WHERE type = 'index' AND name LIKE 'ix_%'"
+        ))}
+    assert indexes == {'ix_users_email', 'ix_houses_name_lower', 'ix_characters_house_id', 'ix_characters_house_id_name'}
+
+
+def test_audit_indexes_refuses_names_differing_in_case(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'cased.db'}")
+    migrations.upgrade(engine)
+    with engine.begin() as connection:
+        connection.execute(text("DROP INDEX ix_houses_name_lower"))
+        connection.execute(text("DELETE FROM schema_migrations WHERE version = 5"))
+        connection.execute(text("INSERT INTO houses (name) VALUES ('Stark'), ('stark'), ('Tully'), ('Lannister')"))
+        connection.execute(text("INSERT INTO houses (name) VALUES ('LANNISTER'), ('lannister')"))
+    with pytest.raises(migrations.MigrationError) as error:
+        migrations.upgrade(engine)
+    assert str(error.value).endswith("'LANNISTER', 'Lannister', 'lannister'; 'Stark', 'stark'")
+    with engine.connect() as connection:
+        assert 5 not in migrations.applied_versions(connection)
+
+    with engine.begin() as connection:
+        connection.execute(text("DELETE FROM houses WHERE name IN ('stark', 'LANNISTER', 'lannister')"))
+    assert [migration.version for migration in migrations.upgrade(engine)] == [5]
+
+
+def test_cold_start_budget(tmp_path):
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{tmp_path / 'startup.db'}", DB_MIGRATE_ON_STARTUP='true')
+    output = subprocess.run(
+        [sys.executable, '-c', STARTUP_SCRIPT],
+        cwd=Path(__file__).parents[1], env=env, capture_output=True, check=True, text=True
+    ).stdout
+    startup = json.loads(output.splitlines()[-1])
+    assert startup['status'] == 200
+    assert startup['lazy'] == ['jose', 'passlib']
+    assert startup['import'] < IMPORT_BUDGET
+    assert startup['first_response'] < FIRST_RESPONSE_BUDGET
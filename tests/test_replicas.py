@@ -0,0 +1,76 @@
+import time
+
+from src import replicas
+from src.database import create_db_engine
+from src.metrics import PoolStats
+from src.replicas import Replica, ReplicaSet
+
+
+def make_replica(url):
+    return Replica('replica_0', create_db_engine(url, PoolStats()), session_factory=None)
+
+
+def test_check_marks_reachable_replica_healthy(tmp_path):
+    replica = make_replica(f"sqlite:///{tmp_path / 'replica.db'}")
+    replica_set = ReplicaSet([replica])
+    replica_set.check(replica)
+    assert replica.healthy and replica.lag == 0
+    assert replica_set.choose() is replica
+    assert replica_set.stats() == {'replica_0': {'healthy': True, 'lag_seconds': 0}}
+
+
+def test_check_skips_lagging_replica(tmp_path):
+    replica = make_replica(f"sqlite:///{tmp_path / 'replica.db'}")
+    replica_set = ReplicaSet([replica], max_lag=5, lag=lambda connection: 30)
+    replica_set.check(replica)
+    assert not replica.healthy and replica.lag == 30
+    assert replica_set.choose() is None
+
+
+def postgres_lag_query(receive_lsn, replay_lsn, since_last_replay):
+    """The Postgres lag query with its replication functions replaced by values SQLite can run."""
+    return (
+        replicas.lag_queries['postgresql']
+        .replace('pg_last_wal_receive_lsn()', f"'{receive_lsn}'")
+        .replace('pg_last_wal_replay_lsn()', f"'{replay_lsn}'")
+        .replace('COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)', str(since_last_replay))
+    )
+
+
+def test_idle_caught_up_replica_stays_in_rotation(tmp_path, monkeypatch):
+    # The primary last wrote an hour ago and the replica has replayed all of it
+    monkeypatch.setitem(replicas.lag_queries, 'sqlite', postgres_lag_query('0/3000060', '0/3000060', 3600))
+    replica = make_replica(f"sqlite:///{tmp_path / 'replica.db'}")
+    replica_set = ReplicaSet([replica], max_lag=5)
+    replica_set.check(replica)
+    assert replica.healthy and replica.lag == 0
+    assert replica_set.choose() is replica
+
+    monkeypatch.setitem(replicas.lag_queries, 'sqlite', postgres_lag_query('0/3000060', '0/2000000', 3600))
+    replica_set.check(replica)
+    assert not replica.healthy and replica.lag == 3600
+
+
+def test_check_skips_unreachable_replica(tmp_path):
+    replica = make_replica(f"sqlite:///file:{tmp_path / 'missing.db'}?mode=ro&uri=true")
+    replica_set = ReplicaSet([replica])
+    replica_set.check(replica)
+    assert not replica.healthy and replica.lag is None
+
+
+def test_choose_checks_in_the_background(tmp_path):
+    healthy = make_replica(f"sqlite:///{tmp_path / 'replica.db'}")
+    down = make_replica(f"sqlite:///file:{tmp_path / 'missing.db'}?mode=ro&uri=true")
+    replica_set = ReplicaSet([down, healthy], check_interval=60)
+    assert not healthy.healthy
+    deadline = time.monotonic() + 5
+    while replica_set.choose() is None and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert {replica_set.choose() for _ in range(4)} == {healthy}
+
+
+def test_wrote_recently():
+    assert replicas.wrote_recently({replicas.STICKY_COOKIE: str(time.time() + 5)})
+    assert not replicas.wrote_recently({replicas.STICKY_COOKIE: str(time.time() - 1)})
+    assert not replicas.wrote_recently({replicas.STICKY_COOKIE: 'garbage'})
+    assert not replicas.wrote_recently({})
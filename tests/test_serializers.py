@@ -0,0 +1,28 @@
+from fastapi.responses import JSONResponse
+
+from src import models, schemas, serializers
+
+
+def make_house():
+    house = models.House(id=1, name='Stark', words='Winter is coming', description=None)
+    house.members = [
+        models.Character(id=2, name='Arya', titles='Princess', description='Nobody', house_id=1),
+        models.Character(id=3, name='Bran', house_id=1)
+    ]
+    return house
+
+
+def test_house_to_dict_matches_schema():
+    house = make_house()
+    assert serializers.house_to_dict(house) == schemas.House.from_orm(house).dict()
+
+
+def test_dumps_matches_json_response():
+    content = [serializers.house_to_dict(make_house())]
+    assert serializers.dumps(content) == JSONResponse(content).body
+
+
+def test_house_to_dict_with_fields():
+    house = make_house()
+    assert serializers.house_to_dict(house, ('name', 'id')) == {'name': 'Stark', 'id': 1}
+    assert len(serializers.house_to_dict(house, ('id', 'members'))['members']) == 2